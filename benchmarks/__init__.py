@@ -0,0 +1,22 @@
+"""Offline benchmarks. Nothing here talks to Telegram, Jellyfin or Jellyseerr."""
+
+import os
+import tempfile
+
+# config.Config требует все переменные окружения — для бенчмарков хватит заглушек
+_DUMMY_ENV = {
+    "TELEGRAM_API_ID": "1",
+    "TELEGRAM_API_HASH": "bench",
+    "TELEGRAM_BOT_TOKEN": "1:bench",
+    "JELLYSEERR_URL": "http://jellyseerr.invalid",
+    "JELLYSEERR_API_KEY": "bench",
+    "JELLYFIN_URL": "http://jellyfin.invalid",
+    "JELLYFIN_API_KEY": "bench",
+    "TMDB_API_KEY": "bench",
+    "TVDB_API_KEY": "bench",
+    "ADMIN_USER_IDS": "[1]",
+    "DB_PATH": os.path.join(tempfile.mkdtemp(prefix="tellyseerr-bench-"), "bench.db"),
+}
+
+for _key, _value in _DUMMY_ENV.items():
+    os.environ.setdefault(_key, _value)
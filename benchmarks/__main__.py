@@ -0,0 +1,118 @@
+"""Runs the offline benchmark suite and compares it with a stored baseline.
+
+    python -m benchmarks                      # run and compare with benchmarks/baseline.json
+    python -m benchmarks --save               # run and overwrite the baseline
+    python -m benchmarks -k db. --quick       # only matching cases, shorter rounds
+
+Baselines are only comparable on the same machine: re-save one before
+measuring a change.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import benchmarks  # noqa: F401  (sets dummy env before config is imported)
+from benchmarks import bench_database, bench_formatting, bench_i18n, bench_markup
+from benchmarks.harness import ROUND_SECONDS, ROUNDS, measure
+
+SUITES = [bench_formatting, bench_markup, bench_i18n, bench_database]
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _run_suites(pattern: str | None, round_seconds: float, rounds: int) -> dict:
+    results = {}
+    for suite in SUITES:
+        cases = [c for c in await suite.cases() if not pattern or pattern in c.name]
+        try:
+            for case in cases:
+                results[case.name] = await measure(case, round_seconds, rounds)
+                r = results[case.name]
+                print(
+                    f"{case.name:<42} {r['ns_per_op'] / 1000:10.2f} µs/op "
+                    f"{r['ops_per_sec']:12,.0f} ops/s   peak {r['peak_bytes']:>8,} B   "
+                    f"retained {r['retained_bytes']:>6,} B/op",
+                    flush=True,
+                )
+        finally:
+            teardown = getattr(suite, "teardown", None)
+            if teardown is not None:
+                await teardown()
+    return results
+
+
+def _compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Prints deltas against the baseline and returns the regressed case names."""
+    regressed = []
+    print(f"\nAgainst baseline from {baseline.get('created_at')} (rev {baseline.get('revision')}):")
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"  {name:<42} new")
+            continue
+        time_delta = (r["ns_per_op"] - base["ns_per_op"]) / base["ns_per_op"]
+        peak_delta = r["peak_bytes"] - base["peak_bytes"]
+        flag = ""
+        if time_delta > threshold:
+            flag = "  <-- REGRESSION"
+            regressed.append(name)
+        print(f"  {name:<42} time {time_delta:+7.1%}   peak {peak_delta:+8,} B{flag}")
+    return regressed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this")
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--threshold", type=float, default=0.15,
+        help="slowdown vs baseline reported as a regression (default 0.15 = 15%%)",
+    )
+    parser.add_argument("--quick", action="store_true", help="shorter rounds, noisier numbers")
+    args = parser.parse_args(argv)
+
+    # format_media_item пишет в лог на каждый вызов — в замерах не печатаем
+    logging.basicConfig(level=logging.WARNING)
+
+    round_seconds = ROUND_SECONDS / 4 if args.quick else ROUND_SECONDS
+    rounds = 3 if args.quick else ROUNDS
+    results = asyncio.run(_run_suites(args.pattern, round_seconds, rounds))
+
+    if args.save:
+        data = {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "results": results,
+        }
+        args.baseline.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save to create one.")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    return 1 if _compare(results, baseline, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
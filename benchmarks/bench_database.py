@@ -0,0 +1,181 @@
+"""Query functions of bot.services.database against a temporary SQLite file.
+
+`python -m benchmarks` runs cases() as part of the suite. Running this
+module directly compares per-query latency with and without the
+connection pool: python -m benchmarks.bench_database [iterations]
+"""
+
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import benchmarks  # noqa: F401  (sets dummy env before config is imported)
+from benchmarks.harness import Case
+from bot.services import database
+
+USERS = 200
+WATCH_ITEMS = 500
+
+
+async def _measure(label: str, fn, iterations: int):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await fn(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<38} mean {statistics.fmean(samples):8.1f} µs   "
+        f"p50 {statistics.median(samples):8.1f} µs   p95 {p95:8.1f} µs"
+    )
+
+
+async def _run_queries(mode: str, iterations: int):
+    await _measure(
+        f"[{mode}] get_linked_user",
+        lambda i: database.get_linked_user(str(i % USERS)),
+        iterations,
+    )
+    await _measure(
+        f"[{mode}] check_vip",
+        lambda i: database.check_vip(str(i % USERS)),
+        iterations,
+    )
+    await _measure(
+        f"[{mode}] store_linked_user",
+        lambda i: database.store_linked_user(str(i % USERS), "1", "jf", f"user{i}"),
+        iterations,
+    )
+
+
+async def _seed():
+    await database.init_db()
+    soon = (datetime.utcnow() + timedelta(days=7)).isoformat()
+    for i in range(USERS):
+        await database.store_linked_user(
+            str(i), str(i), f"jf{i}", f"user{i}", soon if i % 4 == 0 else None
+        )
+        if i % 2 == 0:
+            await database.set_vip(str(i))
+        else:
+            await database.activate_trial(str(i))
+    await database.replace_user_directory(
+        [(f"jf{i}", i, f"user{i}") for i in range(USERS)]
+    )
+    await database.store_watch_items(
+        "jf0", [(f"item{n}", 600_000_000 * 60) for n in range(WATCH_ITEMS)], "2024-01-01"
+    )
+    for i in range(USERS):
+        await database.store_poster_file_id(f"https://image.tmdb.org/t/p/w500/{i}.jpg", f"f{i}", f"u{i}")
+
+
+async def cases() -> list[Case]:
+    await _seed()
+    counter = itertools.count()
+    now = datetime.utcnow().isoformat()
+    watch_batch = [(f"item{n}", 600_000_000 * 60) for n in range(50)]
+    directory_batch = [(f"jf{i}", i, f"user{i}") for i in range(20)]
+
+    def user() -> str:
+        return str(next(counter) % USERS)
+
+    async def invite_roundtrip():
+        code = await database.create_invite_code(user())
+        await database.use_invite_code(code, user())
+
+    # Пишущие запросы сразу возвращают данные на место, чтобы замеры не дрейфовали
+    async def delete_and_restore(delete):
+        telegram_id = str(USERS + next(counter) % USERS)
+        await database.store_linked_user(telegram_id, telegram_id, f"jf{telegram_id}", f"user{telegram_id}")
+        await delete(telegram_id)
+
+    async def remove_and_restore_directory_user():
+        i = next(counter) % USERS
+        await database.remove_directory_user(f"jf{i}", i)
+        await database.upsert_directory_users([(f"jf{i}", i, f"user{i}")])
+
+    async def delete_and_restore_poster():
+        i = next(counter) % USERS
+        url = f"https://image.tmdb.org/t/p/w500/{i}.jpg"
+        await database.delete_poster_file_id(url)
+        await database.store_poster_file_id(url, f"f{i}", f"u{i}")
+
+    return [
+        Case("db.get_linked_user", lambda: database.get_linked_user(user()), True),
+        Case(
+            "db.store_linked_user",
+            lambda: database.store_linked_user(user(), "1", "jf", "user"),
+            True,
+        ),
+        Case("db.delete_linked_user+store", lambda: delete_and_restore(database.delete_linked_user), True),
+        Case("db.delete_user+store", lambda: delete_and_restore(database.delete_user), True),
+        Case("db.get_due_expiring_users", lambda: database.get_due_expiring_users(now), True),
+        Case("db.get_next_expiry", lambda: database.get_next_expiry(now), True),
+        Case("db.get_all_linked_users", database.get_all_linked_users, True),
+        Case("db.get_user_by_username", lambda: database.get_user_by_username(f"user{user()}"), True),
+        Case("db.link_user", lambda: database.link_user(user(), "1", "user"), True),
+        Case("db.check_trial", lambda: database.check_trial(user()), True),
+        Case("db.check_vip", lambda: database.check_vip(user()), True),
+        Case("db.create_invite_code+use_invite_code", invite_roundtrip, True),
+        Case("db.activate_trial", lambda: database.activate_trial(user()), True),
+        Case("db.set_vip", lambda: database.set_vip(user()), True),
+        Case("db.get_watch_aggregate", lambda: database.get_watch_aggregate("jf0"), True),
+        Case(
+            "db.store_watch_items[50]",
+            lambda: database.store_watch_items("jf1", watch_batch, now),
+            True,
+        ),
+        Case("db.upsert_directory_users[20]", lambda: database.upsert_directory_users(directory_batch), True),
+        Case(
+            "db.prune_directory_jellyfin_users",
+            lambda: database.prune_directory_jellyfin_users([f"jf{i}" for i in range(USERS)]),
+            True,
+        ),
+        Case("db.remove_directory_user+upsert", remove_and_restore_directory_user, True),
+        Case(
+            "db.find_directory_user_by_username",
+            lambda: database.find_directory_user_by_username(f"USER{user()}"),
+            True,
+        ),
+        Case(
+            "db.find_directory_user_by_jellyfin_id",
+            lambda: database.find_directory_user_by_jellyfin_id(f"jf{user()}"),
+            True,
+        ),
+        Case(
+            "db.get_poster_file_id",
+            lambda: database.get_poster_file_id(f"https://image.tmdb.org/t/p/w500/{user()}.jpg"),
+            True,
+        ),
+        Case(
+            "db.store_poster_file_id",
+            lambda: database.store_poster_file_id("https://image.tmdb.org/t/p/w500/x.jpg", "f", "u"),
+            True,
+        ),
+        Case("db.delete_poster_file_id+store", delete_and_restore_poster, True),
+    ]
+
+
+async def teardown():
+    await database.close_db()
+
+
+async def main(iterations: int):
+    print(f"Database: {database.DB_PATH}, {iterations} iterations per query\n")
+    await database.init_db()
+    for i in range(USERS):
+        await database.store_linked_user(str(i), str(i), f"jf{i}", f"user{i}")
+
+    await _run_queries("pool", iterations)
+
+    # Без пула каждый вызов открывает своё соединение — так было раньше
+    await database.close_db()
+    await _run_queries("per-call connect", iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
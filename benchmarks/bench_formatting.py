@@ -0,0 +1,58 @@
+"""format_media_item and format_request_item, with Jellyseerr stubbed out."""
+
+import httpx
+
+import benchmarks  # noqa: F401  (sets dummy env before config is imported)
+from benchmarks.harness import Case
+from bot.helpers import formatting
+from bot.services.request_cache import RequestRecord
+
+SEARCH_ITEM = {
+    "id": 603,
+    "mediaType": "movie",
+    "title": "The Matrix",
+    "releaseDate": "1999-03-30",
+    "overview": "Set in the 22nd century, The Matrix tells the story of a computer hacker "
+    "who joins a group of underground insurgents fighting the vast and powerful "
+    "computers who now rule the earth. " * 2,
+    "posterPath": "/f89U3ADr1oiB1s9GkdPOEpXUk5H.jpg",
+}
+
+DETAILS = {
+    "id": 1399,
+    "name": "Game of Thrones",
+    "firstAirDate": "2011-04-17",
+    "posterPath": "/1XS1oqL89opfnbLl8WnZY1O1uJx.jpg",
+    "overview": "x" * 2000,
+    "seasons": [{"seasonNumber": n} for n in range(9)],
+}
+
+
+def _stub_jellyseerr(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json=DETAILS)
+
+
+async def cases() -> list[Case]:
+    # Заглушка вместо сети: измеряем парсинг и форматирование, а не Jellyseerr
+    formatting.jellyseerr_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(_stub_jellyseerr)
+    )
+    record = RequestRecord("tv", 1399, 2, "2024-05-01T10:00:00.000Z")
+
+    async def request_item_miss():
+        formatting.details_cache.clear()
+        await formatting.format_request_item(record, 3, 40)
+
+    return [
+        Case("format_media_item", lambda: formatting.format_media_item(SEARCH_ITEM, 3, 20)),
+        Case(
+            "format_request_item[cached]",
+            lambda: formatting.format_request_item(record, 3, 40),
+            is_async=True,
+        ),
+        Case("format_request_item[miss]", request_item_miss, is_async=True),
+    ]
+
+
+async def teardown():
+    await formatting.jellyseerr_client.aclose()
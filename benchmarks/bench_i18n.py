@@ -0,0 +1,14 @@
+"""bot.i18n: t() lookups (plain, formatted, missing) and per-user locale resolution."""
+
+import benchmarks  # noqa: F401  (sets dummy env before config is imported)
+from benchmarks.harness import Case
+from bot.i18n import t, user_locale
+
+
+async def cases() -> list[Case]:
+    return [
+        Case("t[plain]", lambda: t("searching")),
+        Case("t[format]", lambda: t("request_progress", current=3, total=40)),
+        Case("t[missing]", lambda: t("no_such_key")),
+        Case("user_locale[cached]", lambda: user_locale(42, "en-US")),
+    ]
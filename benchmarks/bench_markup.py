@@ -0,0 +1,21 @@
+"""Inline keyboard builders used on every search and /requests page."""
+
+import benchmarks  # noqa: F401  (sets dummy env before config is imported)
+from benchmarks.harness import Case
+from bot.helpers.markup import (
+    create_media_pagination_markup,
+    create_requests_pagination_markup,
+)
+
+
+async def cases() -> list[Case]:
+    return [
+        Case(
+            "create_media_pagination_markup",
+            lambda: create_media_pagination_markup("Xq3_a-9Z", 3, 20, "movie", 603),
+        ),
+        Case(
+            "create_requests_pagination_markup",
+            lambda: create_requests_pagination_markup(123456789, 3, 40),
+        ),
+    ]
@@ -0,0 +1,127 @@
+"""A stand-in for the Pyrogram client that records what the bot sends.
+
+Handlers receive real pyrogram.types.Message and CallbackQuery objects
+bound to FakeTelegram, so their bound methods (reply, edit, answer, ...)
+land here instead of on Telegram. Each API call takes `latency` seconds.
+"""
+
+import asyncio
+import itertools
+import random
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from pyrogram import enums, types
+
+
+class FakeTelegram:
+    def __init__(self, latency: float = 0.03):
+        self.latency = latency
+        self.me = types.User(id=1, is_bot=True, first_name="Load test", username="loadtest_bot")
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(1)
+        # chat_id -> last bot message that carries an inline keyboard
+        self.keyboards: dict[int, types.Message] = {}
+        # chat_id -> message_id -> photo shown in that message
+        self._photos: dict[int, dict[int, types.Photo]] = {}
+
+    async def _call(self, method: str):
+        self.calls[method] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def _photo(self, media: str) -> types.Photo:
+        # Как в Telegram: URL загружается заново, file_id даёт тот же файл
+        if media.startswith("fake-file:"):
+            unique = media.split(":", 2)[1]
+        else:
+            unique = f"{zlib.crc32(media.encode()):08x}"
+        return types.Photo(
+            file_id=f"fake-file:{unique}:{next(self._ids)}",
+            file_unique_id=unique,
+            width=500,
+            height=750,
+            file_size=50_000,
+            date=datetime.now(),
+        )
+
+    def user_message(self, user: types.User, text: str) -> types.Message:
+        """A private text message from `user`, as Pyrogram would parse it."""
+        return types.Message(
+            id=next(self._ids),
+            chat=types.Chat(id=user.id, type=enums.ChatType.PRIVATE, first_name=user.first_name),
+            from_user=user,
+            date=datetime.now(),
+            text=text,
+            client=self,
+        )
+
+    def callback_query(self, user: types.User, message: types.Message, data: str) -> types.CallbackQuery:
+        return types.CallbackQuery(
+            id=str(next(self._ids)),
+            from_user=user,
+            chat_instance=str(user.id),
+            message=message,
+            data=data,
+            client=self,
+        )
+
+    def _bot_message(self, chat_id: int, message_id=None, text=None, caption=None, photo=None, reply_markup=None):
+        if message_id is None:
+            message_id = next(self._ids)
+        photos = self._photos.setdefault(chat_id, {})
+        if photo is not None:
+            photos[message_id] = photo
+        message = types.Message(
+            id=message_id,
+            chat=types.Chat(id=chat_id, type=enums.ChatType.PRIVATE),
+            from_user=self.me,
+            date=datetime.now(),
+            text=text,
+            caption=caption,
+            photo=photos.get(message_id),
+            reply_markup=reply_markup,
+            client=self,
+        )
+        if reply_markup is not None:
+            self.keyboards[chat_id] = message
+        elif self.keyboards.get(chat_id) is not None and self.keyboards[chat_id].id == message_id:
+            del self.keyboards[chat_id]
+        return message
+
+    # --- Методы Client, которые вызывают handlers и bound-методы типов ---
+
+    async def send_message(self, chat_id, text, reply_markup=None, **_):
+        await self._call("send_message")
+        return self._bot_message(chat_id, text=text, reply_markup=reply_markup)
+
+    async def send_photo(self, chat_id, photo, caption=None, reply_markup=None, **_):
+        await self._call("send_photo")
+        return self._bot_message(chat_id, caption=caption, photo=self._photo(photo), reply_markup=reply_markup)
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None, **_):
+        await self._call("edit_message_text")
+        return self._bot_message(chat_id, message_id, text=text, reply_markup=reply_markup)
+
+    async def edit_message_caption(self, chat_id, message_id, caption, reply_markup=None, **_):
+        await self._call("edit_message_caption")
+        return self._bot_message(chat_id, message_id, caption=caption, reply_markup=reply_markup)
+
+    async def edit_message_media(self, chat_id, message_id, media, reply_markup=None, **_):
+        await self._call("edit_message_media")
+        return self._bot_message(
+            chat_id, message_id, caption=media.caption, photo=self._photo(media.media), reply_markup=reply_markup
+        )
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None, **_):
+        await self._call("edit_message_reply_markup")
+        return self._bot_message(chat_id, message_id, reply_markup=reply_markup)
+
+    async def delete_messages(self, chat_id, message_ids, **_):
+        await self._call("delete_messages")
+        return True
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=None, **_):
+        await self._call("answer_callback_query")
+        return True
@@ -0,0 +1,195 @@
+"""Local stand-ins for Jellyseerr and Jellyfin with configurable latency and payload sizes.
+
+    python -m benchmarks.fake_upstreams --jellyseerr-port 15055 --jellyfin-port 18096
+
+Only the endpoints the bot calls are implemented, with responses shaped
+like the real ones. Every response is delayed by `latency` seconds
+(+-50% jitter). GET /__stats on either port returns request counts per
+upstream and endpoint as JSON. The load test starts this module in a
+separate process so the fake servers do not compete with the bot for its
+event loop.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import zlib
+from collections import Counter
+
+from bot.services.http_server import HTTPServer, Request, Response
+
+JSON = "application/json"
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36})$")
+
+
+def _label(request: Request) -> str:
+    path = "/".join("{id}" if _ID_SEGMENT.match(s) else s for s in request.path.split("/"))
+    return f"{request.method} {path}"
+
+
+class FakeUpstreams:
+    def __init__(
+        self,
+        latency: float,
+        search_results: int,
+        user_requests: int,
+        played_items: int,
+        overview_bytes: int,
+    ):
+        self.latency = latency
+        self.search_results = search_results
+        self.user_requests = user_requests
+        self.played_items = played_items
+        self.overview = "Lorem ipsum dolor sit amet. " * max(1, overview_bytes // 28)
+        self.counts: Counter = Counter()
+
+    async def _delay(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def _media(self, tmdb_id: int, media_type: str) -> dict:
+        title_key = "title" if media_type == "movie" else "name"
+        date_key = "releaseDate" if media_type == "movie" else "firstAirDate"
+        return {
+            "id": tmdb_id,
+            "mediaType": media_type,
+            title_key: f"Title {tmdb_id}",
+            date_key: f"{1980 + tmdb_id % 45}-01-01",
+            "overview": self.overview,
+            "posterPath": f"/poster{tmdb_id}.jpg",
+            "popularity": 10.0,
+        }
+
+    def _results(self, seed: int, page: int, per_page: int = 20) -> list[dict]:
+        first = (page - 1) * per_page
+        last = min(self.search_results, first + per_page)
+        return [
+            self._media(seed * 1000 + n, "movie" if n % 2 else "tv")
+            for n in range(first, last)
+        ]
+
+    def _page(self, seed: int, page: int) -> dict:
+        return {
+            "page": page,
+            "totalPages": max(1, -(-self.search_results // 20)),
+            "totalResults": self.search_results,
+            "results": self._results(seed, page),
+        }
+
+    async def jellyseerr(self, request: Request) -> Response:
+        self.counts[f"jellyseerr {_label(request)}"] += 1
+        await self._delay()
+        path = request.path
+        page = int(request.query.get("page", 1))
+
+        if path == "/api/v1/search":
+            body = self._page(zlib.crc32(request.query.get("query", "").encode()) % 10_000, page)
+        elif path.startswith("/api/v1/discover/"):
+            body = self._page(1 if path.endswith("movies") else 2, page)
+        elif path.startswith(("/api/v1/movie/", "/api/v1/tv/")):
+            media_type = "movie" if "/movie/" in path else "tv"
+            body = self._media(int(path.rsplit("/", 1)[1]), media_type)
+            if media_type == "tv":
+                body["seasons"] = [{"seasonNumber": n} for n in range(6)]
+        elif path.startswith("/api/v1/request/"):
+            request_id = int(path.rsplit("/", 1)[1])
+            body = {
+                "id": request_id,
+                "status": 2,
+                "media": {"mediaType": "movie", "tmdbId": 500 + request_id % 1000},
+                "requestedBy": {"id": request_id // 1000},
+            }
+        elif path == "/api/v1/request" and request.method == "POST":
+            return Response(201, json.dumps({"id": random.randint(1, 10**6)}), JSON)
+        elif path == "/api/v1/request":
+            take = int(request.query.get("take", 20))
+            skip = int(request.query.get("skip", 0))
+            owner = int(request.query.get("requestedBy", 0))
+            results = [
+                {
+                    "id": owner * 1000 + n,
+                    "status": 1 + n % 5,
+                    "createdAt": f"2024-{1 + n % 12:02d}-{1 + n % 28:02d}T10:00:00.000Z",
+                    "media": {"mediaType": "movie" if n % 2 else "tv", "tmdbId": 500 + n},
+                    "requestedBy": {"id": owner},
+                }
+                for n in range(skip, min(self.user_requests, skip + take))
+            ]
+            body = {
+                "pageInfo": {
+                    "pages": max(1, -(-self.user_requests // max(1, take))),
+                    "pageSize": take,
+                    "results": self.user_requests,
+                    "page": skip // max(1, take) + 1,
+                },
+                "results": results,
+            }
+        elif path == "/api/v1/status":
+            body = {"version": "fake"}
+        else:
+            return Response(404, "not found")
+        return Response(200, json.dumps(body), JSON)
+
+    async def jellyfin(self, request: Request) -> Response:
+        self.counts[f"jellyfin {_label(request)}"] += 1
+        await self._delay()
+        if request.path == "/System/Info/Public":
+            return Response(200, json.dumps({"Version": "fake"}), JSON)
+        if not request.path.endswith("/Items"):
+            return Response(404, "not found")
+
+        limit = int(request.query.get("Limit", 100))
+        start = int(request.query.get("StartIndex", 0))
+        items = [
+            {
+                "Id": f"{n:032x}",
+                "Name": f"Episode {n}",
+                "Type": "Episode" if n % 3 else "Movie",
+                "SeriesName": f"Series {n // 10}",
+                "RunTimeTicks": 600_000_000 * (20 + n % 100),
+            }
+            for n in range(start, min(self.played_items, start + limit))
+        ]
+        body = {"Items": items, "TotalRecordCount": self.played_items, "StartIndex": start}
+        return Response(200, json.dumps(body), JSON)
+
+    async def stats(self, _: Request) -> Response:
+        return Response(200, json.dumps(dict(self.counts)), JSON)
+
+
+async def serve(args):
+    fake = FakeUpstreams(
+        args.latency, args.search_results, args.user_requests, args.played_items, args.overview_bytes
+    )
+    servers = [
+        HTTPServer("Fake Jellyseerr", args.host, args.jellyseerr_port,
+                   {("GET", "/__stats"): fake.stats}, fallback=fake.jellyseerr),
+        HTTPServer("Fake Jellyfin", args.host, args.jellyfin_port,
+                   {("GET", "/__stats"): fake.stats}, fallback=fake.jellyfin),
+    ]
+    for server in servers:
+        await server.start()
+    print("ready", flush=True)
+    await asyncio.Event().wait()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.05, help="mean upstream latency, seconds")
+    parser.add_argument("--search-results", type=int, default=60, help="total results per search")
+    parser.add_argument("--user-requests", type=int, default=40, help="requests per user in /requests")
+    parser.add_argument("--played-items", type=int, default=300, help="played items per Jellyfin user")
+    parser.add_argument("--overview-bytes", type=int, default=600, help="size of each overview text")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--jellyseerr-port", type=int, default=15055)
+    parser.add_argument("--jellyfin-port", type=int, default=18096)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,94 @@
+"""Timing and allocation measurement shared by the benchmark suite."""
+
+import gc
+import statistics
+import time
+import tracemalloc
+from typing import Callable
+
+# Каждый раунд длится примерно столько, число итераций подбирается само
+ROUND_SECONDS = 0.2
+ROUNDS = 5
+ALLOCATION_SAMPLES = 50
+
+
+class Case:
+    """One benchmarked operation: a zero-argument callable, sync or async."""
+
+    __slots__ = ("name", "fn", "is_async")
+
+    def __init__(self, name: str, fn: Callable, is_async: bool = False):
+        self.name = name
+        self.fn = fn
+        self.is_async = is_async
+
+
+async def _run(case: Case, iterations: int) -> float:
+    fn = case.fn
+    if case.is_async:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await fn()
+        return time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start
+
+
+async def _calibrate(case: Case, round_seconds: float) -> int:
+    iterations = 1
+    while True:
+        elapsed = await _run(case, iterations)
+        if elapsed >= round_seconds / 10 or iterations >= 1_000_000:
+            break
+        iterations *= 10
+    return max(1, int(iterations * round_seconds / max(elapsed, 1e-9)))
+
+
+async def _call(case: Case):
+    if case.is_async:
+        await case.fn()
+    else:
+        case.fn()
+
+
+async def _allocations(case: Case) -> tuple[int, int]:
+    """(peak bytes of one call, bytes still held per call) under tracemalloc."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(ALLOCATION_SAMPLES):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            await _call(case)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+
+        gc.collect()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(ALLOCATION_SAMPLES):
+            await _call(case)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks)), max(0, (after - before) // ALLOCATION_SAMPLES)
+
+
+async def measure(case: Case, round_seconds: float = ROUND_SECONDS, rounds: int = ROUNDS) -> dict:
+    """Median ns/op over `rounds` calibrated rounds, plus allocation figures."""
+    iterations = await _calibrate(case, round_seconds)
+    per_op = []
+    for _ in range(rounds):
+        per_op.append(await _run(case, iterations) / iterations)
+    ns_per_op = statistics.median(per_op) * 1e9
+    peak_bytes, retained_bytes = await _allocations(case)
+    return {
+        "ns_per_op": round(ns_per_op, 1),
+        "ops_per_sec": round(1e9 / ns_per_op, 1) if ns_per_op else 0.0,
+        "spread": round((max(per_op) - min(per_op)) / statistics.median(per_op), 3),
+        "peak_bytes": peak_bytes,
+        "retained_bytes": retained_bytes,
+        "iterations": iterations,
+    }
@@ -0,0 +1,337 @@
+"""End-to-end load test: real handlers, fake Telegram, fake Jellyseerr/Jellyfin.
+
+    python -m benchmarks.loadtest --users 2000 --latency 0.05
+
+Each simulated user runs /request -> search -> pages through results ->
+requests a title (and a season for series), then /requests with paging,
+then /watch. Updates go through the real handler filters and callbacks,
+with the same middlewares as main.py, via a worker pool like Pyrogram's
+dispatcher that hands them over to the bot's update dispatcher. Buttons are pressed using the callback_data the bot actually
+sent. Reports p50/p95/p99 latency per step (from enqueueing the update to
+the handler returning), upstream and Telegram call counts, and peak RSS.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+import benchmarks
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _parse_args(argv=None):
+    from benchmarks.fake_upstreams import add_arguments
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--users", type=int, default=1000, help="simulated users")
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds over which users start")
+    parser.add_argument("--think", type=float, default=0.5, help="mean pause between a user's actions")
+    parser.add_argument("--pages", type=int, default=3, help="pages flipped in /requests (up to this in search)")
+    parser.add_argument("--queries", type=int, default=200, help="distinct search queries")
+    parser.add_argument("--workers", type=int, default=None, help="Pyrogram workers (default: Pyrogram's)")
+    parser.add_argument("--update-workers", type=int, default=None, help="update dispatcher workers (default: UPDATE_WORKERS)")
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+ARGS = _parse_args() if __name__ == "__main__" else None
+if ARGS is not None:
+    # Бот должен ходить в поддельные сервисы — задаём до импорта config
+    JELLYSEERR_PORT, JELLYFIN_PORT = _free_port(), _free_port()
+    os.environ["JELLYSEERR_URL"] = f"http://127.0.0.1:{JELLYSEERR_PORT}"
+    os.environ["JELLYFIN_URL"] = f"http://127.0.0.1:{JELLYFIN_PORT}"
+    os.environ.setdefault("SLOW_HANDLER_THRESHOLD", "0")
+    os.environ.setdefault("METRICS_PORT", "0")
+
+from pyrogram import ContinuePropagation, StopPropagation, types  # noqa: E402
+
+from benchmarks.fake_telegram import FakeTelegram  # noqa: E402
+from bot import app  # noqa: E402
+from bot.handlers import load_all_handlers  # noqa: E402
+from bot.services import database  # noqa: E402
+from bot.services.http_clients import close_http_client, upstream_stats  # noqa: E402
+from bot.services.metrics import instrument_handler  # noqa: E402
+from bot.services.profiling import profile_handler  # noqa: E402
+from bot.services.dispatcher import dispatch_handler, update_dispatcher  # noqa: E402
+from bot.i18n import localize_handler  # noqa: E402
+
+FIRST_USER_ID = 100_000
+
+
+class Dispatcher:
+    """Feeds updates to the registered handlers through a fixed worker pool."""
+
+    def __init__(self, client: FakeTelegram, workers: int):
+        self.client = client
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def feed(self, step: str, update):
+        done = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((step, update, time.perf_counter(), done))
+        await done
+
+    async def _handle(self, update) -> list[asyncio.Future]:
+        # dispatch_handler возвращает future задачи в update_dispatcher
+        jobs = []
+        for group in app.dispatcher.groups.values():
+            for handler in group:
+                update_type = _update_type(handler)
+                if update_type is None or not isinstance(update, update_type):
+                    continue
+                if not await handler.check(self.client, update):
+                    continue
+                try:
+                    result = await handler.callback(self.client, update)
+                except ContinuePropagation:
+                    continue
+                if isinstance(result, asyncio.Future):
+                    jobs.append(result)
+                break
+        return jobs
+
+    async def _finish(self, step: str, jobs: list[asyncio.Future], queued_at: float, done: asyncio.Future):
+        for job in jobs:
+            try:
+                await job
+            except Exception as e:
+                self.errors[step] += 1
+                logging.getLogger(__name__).debug(f"{step} failed: {e!r}")
+        self.latencies[step].append(time.perf_counter() - queued_at)
+        done.set_result(None)
+
+    async def _worker(self):
+        while True:
+            step, update, queued_at, done = await self.queue.get()
+            jobs = []
+            try:
+                jobs = await self._handle(update)
+            except StopPropagation:
+                pass
+            except Exception as e:
+                self.errors[step] += 1
+                logging.getLogger(__name__).debug(f"{step} failed: {e!r}")
+            # Воркер, как и в Pyrogram, не ждёт окончания обработчика
+            asyncio.create_task(self._finish(step, jobs, queued_at, done))
+
+
+def _update_type(handler):
+    from pyrogram.handlers import CallbackQueryHandler, MessageHandler
+
+    if isinstance(handler, CallbackQueryHandler):
+        return types.CallbackQuery
+    if isinstance(handler, MessageHandler):
+        return types.Message
+    return None
+
+
+def _button(message: types.Message | None, prefix: str, text: str | None = None) -> str | None:
+    """callback_data of the first button starting with `prefix` (and showing `text`)."""
+    if message is None or message.reply_markup is None:
+        return None
+    for row in message.reply_markup.inline_keyboard:
+        for button in row:
+            data = button.callback_data or ""
+            if data.startswith(prefix) and (text is None or button.text == text):
+                return data
+    return None
+
+
+async def _simulate_user(n: int, args, client: FakeTelegram, dispatcher: Dispatcher):
+    user = types.User(id=FIRST_USER_ID + n, first_name=f"User {n}", is_bot=False)
+
+    async def think():
+        await asyncio.sleep(random.expovariate(1 / args.think) if args.think > 0 else 0)
+
+    async def say(step: str, text: str):
+        await dispatcher.feed(step, client.user_message(user, text))
+        await think()
+
+    async def press(step: str, data: str | None):
+        message = client.keyboards.get(user.id)
+        if data is None or message is None:
+            return False
+        await dispatcher.feed(step, client.callback_query(user, message, data))
+        await think()
+        return True
+
+    await asyncio.sleep(random.uniform(0, args.ramp))
+
+    await say("request_cmd", "/request")
+    await say("search", f"movie {n % args.queries}")
+    # Разная глубина листания — чтобы запрашивались и фильмы, и сериалы
+    for _ in range(random.randint(0, args.pages)):
+        if not await press("media_nav", _button(client.keyboards.get(user.id), "media_nav:", "➡️")):
+            break
+    if await press("media_req", _button(client.keyboards.get(user.id), "media_req:")):
+        await press("season_req", _button(client.keyboards.get(user.id), "season_req:"))
+
+    await say("requests", "/requests")
+    for _ in range(args.pages):
+        if not await press("req_nav", _button(client.keyboards.get(user.id), "req_nav:", "➡️")):
+            break
+
+    await say("watch", "/watch")
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def _fetch_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def _start_fake_upstreams(args) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.fake_upstreams",
+        "--jellyseerr-port", str(JELLYSEERR_PORT),
+        "--jellyfin-port", str(JELLYFIN_PORT),
+        "--latency", str(args.latency),
+        "--search-results", str(args.search_results),
+        "--user-requests", str(args.user_requests),
+        "--played-items", str(args.played_items),
+        "--overview-bytes", str(args.overview_bytes),
+    ]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(benchmarks.__file__))),
+    )
+    if process.stdout.readline().strip() != "ready":
+        process.kill()
+        raise RuntimeError("fake upstreams failed to start")
+    return process
+
+
+async def run(args) -> dict:
+    client = FakeTelegram(args.telegram_latency)
+    load_all_handlers(app, middlewares=(instrument_handler, profile_handler, localize_handler, dispatch_handler))
+    await asyncio.sleep(0)  # регистрация обработчиков идёт задачами на loop
+
+    await database.init_db()
+    for n in range(args.users):
+        await database.store_linked_user(
+            str(FIRST_USER_ID + n), str(n + 1), f"{n:032x}", f"user{n}"
+        )
+
+    if args.update_workers:
+        update_dispatcher.workers = args.update_workers
+        update_dispatcher.heavy_workers = max(1, args.update_workers // 2)
+    update_dispatcher.start()
+    dispatcher = Dispatcher(client, args.workers or app.workers)
+    dispatcher.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(_simulate_user(n, args, client, dispatcher) for n in range(args.users))
+        )
+    finally:
+        elapsed = time.perf_counter() - started
+        await dispatcher.stop()
+        await update_dispatcher.stop()
+        await close_http_client()
+        await database.close_db()
+
+    steps = {}
+    for step, samples in dispatcher.latencies.items():
+        samples.sort()
+        steps[step] = {
+            "count": len(samples),
+            "errors": dispatcher.errors.get(step, 0),
+            "p50_ms": round(statistics.median(samples) * 1000, 1),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(samples, 0.99) * 1000, 1),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+    return {
+        "users": args.users,
+        "workers": dispatcher.workers,
+        "update_workers": update_dispatcher.workers,
+        "duration_s": round(elapsed, 2),
+        "updates": sum(s["count"] for s in steps.values()),
+        "steps": steps,
+        "bot_upstream_calls": {
+            f"{upstream} {endpoint}": stats.requests for (upstream, endpoint), stats in upstream_stats.items()
+        },
+        "telegram_calls": dict(client.calls),
+        # ru_maxrss в KiB на Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_before_load_mb": round(rss_before / 1024, 1),
+    }
+
+
+def _print_report(report: dict):
+    print(
+        f"\n{report['users']} users, {report['workers']} Pyrogram workers, "
+        f"{report['update_workers']} update workers, "
+        f"{report['updates']} updates in {report['duration_s']}s "
+        f"({report['updates'] / report['duration_s']:.0f} updates/s)\n"
+    )
+    print(f"{'step':<14}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, s in report["steps"].items():
+        print(
+            f"{step:<14}{s['count']:>8}{s['errors']:>8}{s['p50_ms']:>10}"
+            f"{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}"
+        )
+    print("\nUpstream calls (as served by the fake servers):")
+    for name, count in sorted(report["upstream_calls"].items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>8}  {name}")
+    print("\nTelegram API calls:")
+    for name, count in sorted(report["telegram_calls"].items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>8}  {name}")
+    print(
+        f"\nPeak RSS of the bot process: {report['peak_rss_mb']} MiB "
+        f"({report['rss_before_load_mb']} MiB before the load started)"
+    )
+
+
+def main(args) -> int:
+    logging.basicConfig(level=logging.WARNING)
+    upstreams = _start_fake_upstreams(args)
+    try:
+        report = app.loop.run_until_complete(run(args))
+        report["upstream_calls"] = _fetch_stats(JELLYSEERR_PORT)
+    finally:
+        upstreams.terminate()
+        upstreams.wait()
+
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(ARGS))
@@ -4,16 +4,35 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def load_all_handlers(app):
-    """Auto-import all modules in this package to register their handlers."""
+def load_all_handlers(app, middlewares=()):
+    """Auto-import all modules in this package to register their handlers.
+
+    Each middleware is a callable that takes a handler callback and returns
+    a wrapped one (metrics, profiling). They are applied at registration
+    time, in order, so the first one ends up innermost.
+    """
     package_name = __name__
     package_path = __path__
     logger.info(f"Loading handlers from package: {package_name}")
-    for _, module_name, _ in pkgutil.iter_modules(package_path):
-        if module_name == "__init__":
-            continue
-        try:
-            importlib.import_module(f".{module_name}", package_name)
-            logger.info(f"Successfully loaded handler module: {module_name}")
-        except Exception as e:
-            logger.error(f"Failed to load handler {module_name}: {e}")
+
+    dispatcher = app.dispatcher
+    register = dispatcher.add_handler
+
+    def add_wrapped_handler(handler, group):
+        for middleware in middlewares:
+            handler.callback = middleware(handler.callback)
+        register(handler, group)
+
+    # Обработчики регистрируются декораторами @app.on_* при импорте модуля
+    dispatcher.add_handler = add_wrapped_handler
+    try:
+        for _, module_name, _ in pkgutil.iter_modules(package_path):
+            if module_name == "__init__":
+                continue
+            try:
+                importlib.import_module(f".{module_name}", package_name)
+                logger.info(f"Successfully loaded handler module: {module_name}")
+            except Exception as e:
+                logger.error(f"Failed to load handler {module_name}: {e}")
+    finally:
+        del dispatcher.add_handler
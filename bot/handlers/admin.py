@@ -10,7 +10,12 @@ from pyrogram.types import Message
 from pyrogram.enums import ParseMode
 from bot import app
 from config import settings
-from bot.services.http_clients import http_client, jellyfin_headers, jellyseerr_headers
+from bot.services.http_clients import (
+    jellyfin_client,
+    jellyfin_headers,
+    jellyseerr_client,
+    jellyseerr_headers,
+)
 from bot.services.database import (
     store_linked_user,
     get_all_linked_users,
@@ -18,7 +23,15 @@ from bot.services.database import (
     delete_user,
     activate_trial,
     set_vip,
+    find_directory_user_by_username,
+    upsert_directory_users,
+    remove_directory_user,
+    count_linked_users,
 )
+from bot.services.user_directory import find_jellyseerr_user_id
+from bot.services.profiling import arm_profile, disarm_profile, handler_names
+from bot.services.broadcast import cancel_broadcasts, start_broadcast
+from bot.services.background import spawn_background
 from bot.services.user_state import user_states, UserState
 from bot.i18n import t
 
@@ -49,23 +62,10 @@ async def _create_user(
     jellyfin_user_id = None
     jellyfin_user_created = False
 
-    try:
-        users_url = f"{jellyfin_url}/Users"
-        users_response = await http_client.get(users_url, headers=jellyfin_headers, timeout=10)
-        users_response.raise_for_status()
-        jellyfin_users = users_response.json()
-        existing_user = next(
-            (u for u in jellyfin_users if u.get("Name", "").lower() == username.lower()),
-            None
-        )
-        if existing_user:
-            await reply_message.edit(t("user_already_exists", username=username, id=existing_user.get("Id")))
-            return
-    except httpx.HTTPStatusError as e:
-        await reply_message.edit(t("create_user_failed", error=e.response.text))
-        return
-    except httpx.RequestError as e:
-        await reply_message.edit(t("create_user_failed", error=str(e)))
+    # Проверка по локальному справочнику; если он отстал, Jellyfin сам отклонит дубликат
+    existing_user = await find_directory_user_by_username(username)
+    if existing_user and existing_user[0]:
+        await reply_message.edit(t("user_already_exists", username=username, id=existing_user[0]))
         return
 
     try:
@@ -80,7 +80,7 @@ async def _create_user(
                 "EnableLiveTvManagement": False,
             },
         }
-        response_fin = await http_client.post(
+        response_fin = await jellyfin_client.post(
             f"{jellyfin_url}/Users/New",
             headers=jellyfin_headers,
             json=jellyfin_user_payload
@@ -99,33 +99,26 @@ async def _create_user(
         await reply_message.edit(t("create_user_failed", error="No ID"))
         return
 
-    jellyseerr_user = None
+    jellyseerr_user_id = None
     try:
-        response_seerr_import = await http_client.post(
+        response_seerr_import = await jellyseerr_client.post(
             f"{jellyseerr_url}/api/v1/user/import-from-jellyfin",
             headers=jellyseerr_headers,
             json={"jellyfinUserIds": [jellyfin_user_id]}
         )
         response_seerr_import.raise_for_status()
-        jellyseerr_user = response_seerr_import.json()[0]
+        jellyseerr_user_id = str(response_seerr_import.json()[0].get("id"))
     except Exception as e:
         logger.warning(f"Failed to auto-import {username} to Jellyseerr: {e}. Trying to find...")
         await asyncio.sleep(2)
         try:
-            seerr_users_url = f"{jellyseerr_url}/api/v1/user?take=1000"
-            seerr_response = await http_client.get(seerr_users_url, headers=jellyseerr_headers)
-            seerr_response.raise_for_status()
-            seerr_users = seerr_response.json().get("results", [])
-            jellyseerr_user = next(
-                (u for u in seerr_users if str(u.get("jellyfinUserId")) == str(jellyfin_user_id)),
-                None
-            )
-            if not jellyseerr_user:
+            jellyseerr_user_id = await find_jellyseerr_user_id(jellyfin_user_id)
+            if not jellyseerr_user_id:
                 raise Exception("User not found in Jellyseerr.")
         except Exception as search_e:
             logger.error(f"Failed to find user in Jellyseerr: {search_e}")
             if jellyfin_user_created:
-                await http_client.delete(f"{jellyfin_url}/Users/{jellyfin_user_id}", headers=jellyfin_headers)
+                await jellyfin_client.delete(f"{jellyfin_url}/Users/{jellyfin_user_id}", headers=jellyfin_headers)
             await reply_message.edit(t("create_user_failed", error=str(search_e)))
             return
 
@@ -136,12 +129,13 @@ async def _create_user(
 
     await store_linked_user(
         telegram_id=str(telegram_user_id),
-        jellyseerr_user_id=str(jellyseerr_user.get("id")),
+        jellyseerr_user_id=jellyseerr_user_id,
         jellyfin_user_id=str(jellyfin_user_id),
         username=username,
         expires_at=expires_at,
         role_name=role_name_to_assign,
     )
+    await upsert_directory_users([(str(jellyfin_user_id), jellyseerr_user_id, username)])
 
     try:
         dm_message = t("dm_welcome_header") + "\n\n"
@@ -169,7 +163,7 @@ async def invite_cmd(_, m: Message):
     if not is_admin(m.from_user.id):
         await m.reply("❌ Вы не администратор.")
         return
-    user_states.set(m.from_user.id, UserState.ADMIN_INVITE)
+    await user_states.set(m.from_user.id, UserState.ADMIN_INVITE)
     await m.reply("Ответьте на любое сообщение пользователя, которому хотите создать **постоянный аккаунт**.")
 
 
@@ -178,7 +172,7 @@ async def trial_cmd(_, m: Message):
     if not is_admin(m.from_user.id):
         await m.reply("❌ Вы не администратор.")
         return
-    user_states.set(m.from_user.id, UserState.ADMIN_TRIAL)
+    await user_states.set(m.from_user.id, UserState.ADMIN_TRIAL)
     await m.reply("Ответьте на любое сообщение пользователя, которому хотите выдать **пробный доступ на 7 дней**.")
 
 
@@ -187,21 +181,21 @@ async def vip_cmd(_, m: Message):
     if not is_admin(m.from_user.id):
         await m.reply("❌ Вы не администратор.")
         return
-    user_states.set(m.from_user.id, UserState.ADMIN_VIP)
+    await user_states.set(m.from_user.id, UserState.ADMIN_VIP)
     await m.reply("Ответьте на любое сообщение пользователя, которому хотите выдать **VIP-доступ на 30 дней**.")
 
 
 # Универсальный обработчик — срабатывает при ответе на сообщение
 @app.on_message(filters.reply & filters.private)
 async def admin_reply_handler(_, m: Message):
-    state = user_states.get(m.from_user.id)
+    state = await user_states.get(m.from_user.id)
 
     if state not in (UserState.ADMIN_INVITE, UserState.ADMIN_TRIAL, UserState.ADMIN_VIP):
         return
 
     if not m.reply_to_message or not m.reply_to_message.from_user:
         await m.reply("Ошибка: ответьте на сообщение реального пользователя.")
-        user_states.clear(m.from_user.id)
+        await user_states.clear(m.from_user.id)
         return
 
     target_user = m.reply_to_message.from_user
@@ -219,7 +213,7 @@ async def admin_reply_handler(_, m: Message):
         await _create_user(app, sent, target_id, target_username, 30, "VIP")
         await set_vip(str(target_id), 30)
 
-    user_states.clear(m.from_user.id)
+    await user_states.clear(m.from_user.id)
 
 
 @app.on_message(filters.command("listusers") & filters.private)
@@ -264,19 +258,92 @@ async def deleteuser_cmd(_, m: Message):
     sent = await m.reply(t("deleteuser_searching", username=username))
 
     user_data = await get_user_by_username(username)
-    if not user_data:
-        await sent.edit(t("deleteuser_not_found", username=username))
-        return
-
-    telegram_id, jellyseerr_id, jellyfin_id = user_data
+    if user_data:
+        telegram_id, jellyseerr_id, jellyfin_id = user_data
+    else:
+        # Аккаунт может существовать в Jellyfin/Jellyseerr без привязки к Telegram
+        directory_entry = await find_directory_user_by_username(username)
+        if not directory_entry:
+            await sent.edit(t("deleteuser_not_found", username=username))
+            return
+        telegram_id = None
+        jellyfin_id, jellyseerr_id, _ = directory_entry
 
     try:
         if jellyfin_id:
-            await http_client.delete(f"{settings.JELLYFIN_URL}/Users/{jellyfin_id}", headers=jellyfin_headers)
+            await jellyfin_client.delete(f"{settings.JELLYFIN_URL}/Users/{jellyfin_id}", headers=jellyfin_headers)
         if jellyseerr_id:
-            await http_client.delete(f"{settings.JELLYSEERR_URL}/api/v1/user/{jellyseerr_id}", headers=jellyseerr_headers)
-        await delete_user(telegram_id)
+            await jellyseerr_client.delete(f"{settings.JELLYSEERR_URL}/api/v1/user/{jellyseerr_id}", headers=jellyseerr_headers)
+        if telegram_id:
+            await delete_user(telegram_id)
+        await remove_directory_user(jellyfin_id, jellyseerr_id)
         await sent.edit(t("deleteuser_success", username=username))
     except Exception as e:
         logger.error(f"Error deleting user {username}: {e}")
         await sent.edit(t("generic_exception"))
+
+
+# Сколько ждать нужного вызова обработчика, секунды
+PROFILE_WAIT_TIMEOUT = 600
+
+
+async def _send_profile_report(m: Message, handler_name: str, report):
+    try:
+        text = await asyncio.wait_for(asyncio.shield(report), PROFILE_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        disarm_profile(handler_name)
+        await m.reply(f"⏰ Обработчик <code>{handler_name}</code> не вызывался, профилирование отменено.", parse_mode=ParseMode.HTML)
+        return
+    # Лимит Telegram — 4096 символов
+    await m.reply(f"<pre>{html.escape(text[:3900])}</pre>", parse_mode=ParseMode.HTML)
+
+
+@app.on_message(filters.command("profile") & filters.private)
+async def profile_cmd(_, m: Message):
+    if not is_admin(m.from_user.id):
+        await m.reply("Доступ запрещён.")
+        return
+
+    parts = m.text.split()
+    if len(parts) not in (2, 3) or (len(parts) == 3 and not parts[2].isdigit()):
+        names = ", ".join(sorted(handler_names))
+        await m.reply(f"Использование: /profile <handler> [N]\nОбработчики: {names}")
+        return
+
+    handler_name = parts[1]
+    count = int(parts[2]) if len(parts) == 3 else 1
+    try:
+        report = arm_profile(handler_name, count)
+    except KeyError:
+        await m.reply(f"❌ Обработчик <code>{html.escape(handler_name)}</code> не найден", parse_mode=ParseMode.HTML)
+        return
+
+    await m.reply(f"🔬 Профилирую следующие {count} вызовов <code>{handler_name}</code>…", parse_mode=ParseMode.HTML)
+    # Не занимаем воркер диспетчера, пока ждём вызова
+    spawn_background(_send_profile_report(m, handler_name, report))
+
+
+@app.on_message(filters.command("broadcast") & filters.private)
+async def broadcast_cmd(client: Client, m: Message):
+    if not is_admin(m.from_user.id):
+        await m.reply("Доступ запрещён.")
+        return
+
+    # .html сохраняет форматирование, которое админ набрал в Telegram
+    parts = m.text.html.split(maxsplit=1)
+    if len(parts) != 2:
+        await m.reply(t("broadcast_usage"))
+        return
+
+    if parts[1].strip().lower() == "stop":
+        count = cancel_broadcasts()
+        await m.reply(t("broadcast_stopping", count=count) if count else t("broadcast_not_running"))
+        return
+
+    total = await count_linked_users()
+    if not total:
+        await m.reply(t("broadcast_no_recipients"))
+        return
+    # Это сообщение рассылка будет обновлять по ходу отправки
+    status = await m.reply(t("broadcast_started", total=total))
+    await start_broadcast(client, m.chat.id, status.id, parts[1], total)
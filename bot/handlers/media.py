@@ -4,102 +4,166 @@ from pyrogram.types import Message, CallbackQuery, InputMediaPhoto, InlineKeyboa
 from pyrogram.enums import ParseMode
 from bot import app
 from config import settings
-from bot.services.http_clients import http_client, jellyseerr_headers
+from bot.services.http_clients import FAST_TIMEOUT, jellyseerr_client, jellyseerr_headers
 from bot.services.database import get_linked_user
 from bot.helpers.formatting import format_media_item
 from bot.helpers.markup import create_media_pagination_markup
 from bot.services.user_state import user_states, UserState
+from bot.services.cache import TTLCache
+from bot.services.discover import discover_feed
+from bot.services.result_sessions import PageLoader, create_session, get_session
+from bot.services.dispatcher import heavy
+from bot.services.poster_cache import lookup_poster, send_with_poster
+from bot.services.resilience import UpstreamUnavailable
 from bot.i18n import t
 
 # Импорт для /link
 from bot.handlers.user import _handle_link_credentials
 
 log = logging.getLogger(__name__)
-_cache = {}
+search_cache = TTLCache("search", settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL)
 
-async def _search(q: str):
+
+def _normalize_query(q: str) -> str:
+    return " ".join(q.split()).casefold()
+
+
+async def _fetch_search(q: str, page: int) -> tuple[list[dict], int, int]:
+    # Убрали quote — httpx сам закодирует
+    r = await jellyseerr_client.get(
+        f"{settings.JELLYSEERR_URL}/api/v1/search",
+        params={"query": q, "page": page},
+        headers=jellyseerr_headers,
+        timeout=FAST_TIMEOUT,
+    )
+    r.raise_for_status()
+    data = r.json()
+    return data.get("results", []), data.get("totalResults", 0), data.get("totalPages", 1)
+
+
+async def _search_page(q: str, page: int) -> tuple[list[dict], int, int]:
+    # Одинаковые запросы от разных пользователей схлопываются в один вызов Jellyseerr
+    # Если Jellyseerr недоступен, отдаём устаревшие результаты, когда они есть
+    return await search_cache.get_or_load(
+        (_normalize_query(q), page),
+        lambda: _fetch_search(" ".join(q.split()), page),
+        stale_on_error=True,
+    )
+
+
+async def _search(q: str) -> tuple[list[dict], int, int]:
+    """First page of results, the total and the page count; later pages load as the user pages."""
     try:
-        # Убрали quote — httpx сам закодирует
-        r = await http_client.get(
-            f"{settings.JELLYSEERR_URL}/api/v1/search",
-            params={"query": q},
-            headers=jellyseerr_headers,
-        )
-        r.raise_for_status()
-        results = r.json().get("results", [])
-        _cache[q] = results
-        return results
+        return await _search_page(q, 1)
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         log.error(f"Error searching for '{q}': {e}")
-        return []
+        return [], 0, 0
 
-async def _discover():
-    try:
-        movies = await http_client.get(f"{settings.JELLYSEERR_URL}/api/v1/discover/movies", headers=jellyseerr_headers)
-        tv = await http_client.get(f"{settings.JELLYSEERR_URL}/api/v1/discover/tv", headers=jellyseerr_headers)
-        movies.raise_for_status()
-        tv.raise_for_status()
-        return movies.json().get("results", []) + tv.json().get("results", [])
-    except Exception as e:
-        log.error(f"Error fetching discover: {e}")
-        return []
+async def _discover() -> tuple[list[dict], int, int, PageLoader]:
+    # Общий для всех снимок, обновляется в фоне (bot.services.discover)
+    # Сессия листает тот снимок, с которого начала, даже если лента обновится
+    load = await discover_feed.loader()
+    items, total, pages = await load(1)
+    return items, total, pages, load
 
 @app.on_message(filters.command("request") & filters.private)
 async def request_cmd(_, m: Message):
-    user_states.set(m.from_user.id, UserState.REQUEST_SEARCH)
+    await user_states.set(m.from_user.id, UserState.REQUEST_SEARCH)
     await m.reply(t("enter_movie_series_name"), parse_mode=ParseMode.HTML)
 
 @app.on_message(filters.command("discover") & filters.private)
 async def discover_cmd(_, m: Message):
     wait = await m.reply(t("discover_searching"))
-    res = await _discover()
+    try:
+        res, total, pages, load = await _discover()
+    except UpstreamUnavailable:
+        await wait.edit(t("service_unavailable"))
+        return
     if not res:
         await wait.edit(t("no_results"))
         return
+    session_id = create_session(m.from_user.id, res, total, load, pages)
+    session = get_session(session_id, m.from_user.id)
     item = res[0]
-    text, poster = format_media_item(item, 0, len(res))
-    kb = create_media_pagination_markup("discover", 0, len(res), item.get("mediaType"), item.get("id"))
+    text, poster = format_media_item(item, 0, session.total)
+    kb = create_media_pagination_markup(session_id, 0, session.total, item.get("mediaType"), item.get("id"))
     await wait.delete()
-    await m.reply_photo(poster, caption=text, reply_markup=kb, parse_mode=ParseMode.HTML)
+    await send_with_poster(
+        poster,
+        lambda media: m.reply_photo(media, caption=text, reply_markup=kb, parse_mode=ParseMode.HTML),
+    )
 
 # Исключаем все команды из обработки текста — теперь /requests и /watch проходят дальше!
 @app.on_message(filters.text & ~filters.command(["request", "discover", "link", "requests", "watch", "start", "help", "unlink"]) & filters.private)
+@heavy
 async def text_router(_, m: Message):
-    st = user_states.get(m.from_user.id)
+    st = await user_states.get(m.from_user.id)
     if st == UserState.REQUEST_SEARCH:
-        user_states.clear(m.from_user.id)
+        await user_states.clear(m.from_user.id)
         wait = await m.reply(t("searching"))
-        res = await _search(m.text)
+        try:
+            res, total, pages = await _search(m.text)
+        except UpstreamUnavailable:
+            await wait.edit(t("service_unavailable"))
+            return
         if not res:
             await wait.edit(t("no_results"))
             return
+        query = m.text
+        session_id = create_session(m.from_user.id, res, total, lambda page: _search_page(query, page), pages)
+        session = get_session(session_id, m.from_user.id)
         item = res[0]
-        text, poster = format_media_item(item, 0, len(res))
-        kb = create_media_pagination_markup(m.text, 0, len(res), item.get("mediaType"), item.get("id"))
+        text, poster = format_media_item(item, 0, session.total)
+        kb = create_media_pagination_markup(session_id, 0, session.total, item.get("mediaType"), item.get("id"))
         await wait.delete()
-        await m.reply_photo(poster, caption=text, reply_markup=kb, parse_mode=ParseMode.HTML)
+        await send_with_poster(
+            poster,
+            lambda media: m.reply_photo(media, caption=text, reply_markup=kb, parse_mode=ParseMode.HTML),
+        )
 
     elif st == UserState.LINK_CREDENTIALS:
-        user_states.clear(m.from_user.id)  # ← Добавили очистку состояния
+        # Состояние очищает сам _handle_link_credentials — раньше оно сбрасывалось
+        # здесь, и обработчик молча выходил, не проверив логин и пароль
         await _handle_link_credentials(m)
 
 # Остальные callback'и без изменений
 @app.on_callback_query(filters.regex(r"^media_nav:"))
 async def media_nav(_, cq: CallbackQuery):
-    _, dir_, idx, query = cq.data.split(":", 3)
-    idx = int(idx) + (-1 if dir_ == "prev" else 1)
-    res = await _search(query) if query != "discover" else await _discover()
-    if 0 <= idx < len(res):
-        item = res[idx]
-        text, poster = format_media_item(item, idx, len(res))
-        kb = create_media_pagination_markup(query, idx, len(res), item.get("mediaType"), item.get("id"))
+    try:
+        _, session_id, idx = cq.data.split(":", 2)
+        idx = int(idx)
+    except ValueError:
+        # Кнопки старого формата media_nav:{dir}:{idx}:{query}, оставшиеся с прошлой версии
+        session_id, idx = None, 0
+    session = get_session(session_id, cq.from_user.id) if session_id else None
+    if session is None:
+        await cq.answer(t("search_cache_expired"), show_alert=True)
+        return
+    try:
+        item = await session.get(idx)
+    except UpstreamUnavailable:
+        await cq.answer(t("service_unavailable"), show_alert=True)
+        return
+    except Exception as e:
+        log.error(f"Error loading result {idx} of session {session_id}: {e}")
+        await cq.answer(t("generic_network_error"), show_alert=True)
+        return
+    if item is not None:
+        text, poster = format_media_item(item, idx, session.total)
+        kb = create_media_pagination_markup(session_id, idx, session.total, item.get("mediaType"), item.get("id"))
         current_photo = cq.message.photo
-        if current_photo and poster == current_photo.file_id:
+        cached = await lookup_poster(poster)
+        if current_photo and cached and cached[1] == current_photo.file_unique_id:
             await cq.edit_message_caption(caption=text, reply_markup=kb, parse_mode=ParseMode.HTML)
         else:
-            await cq.edit_message_media(
-                media=InputMediaPhoto(media=poster, caption=text, parse_mode=ParseMode.HTML),
-                reply_markup=kb
+            await send_with_poster(
+                poster,
+                lambda media: cq.edit_message_media(
+                    media=InputMediaPhoto(media=media, caption=text, parse_mode=ParseMode.HTML),
+                    reply_markup=kb
+                ),
             )
     await cq.answer()
 
@@ -113,8 +177,16 @@ async def media_req(_, cq: CallbackQuery):
         return
 
     if media_type == "tv":
-        r = await http_client.get(f"{settings.JELLYSEERR_URL}/api/v1/tv/{tmdb_id}", headers=jellyseerr_headers)
-        r.raise_for_status()
+        try:
+            r = await jellyseerr_client.get(f"{settings.JELLYSEERR_URL}/api/v1/tv/{tmdb_id}", headers=jellyseerr_headers, timeout=FAST_TIMEOUT)
+            r.raise_for_status()
+        except UpstreamUnavailable:
+            await cq.answer(t("service_unavailable"), show_alert=True)
+            return
+        except Exception as e:
+            log.error(f"Error fetching seasons for {tmdb_id}: {e}")
+            await cq.answer(t("generic_network_error"), show_alert=True)
+            return
         seasons = [s.get("seasonNumber") for s in r.json().get("seasons", []) if s.get("seasonNumber", 0) > 0]
         if not seasons:
             await cq.answer(t("seasons_not_found"), show_alert=True)
@@ -130,7 +202,7 @@ async def media_req(_, cq: CallbackQuery):
     payload = {"mediaType": "movie", "mediaId": tmdb_id, "userId": int(linked[0])}
     log.info(f"Sending movie request: {payload}")
     try:
-        response = await http_client.post(f"{settings.JELLYSEERR_URL}/api/v1/request", json=payload, headers=jellyseerr_headers)
+        response = await jellyseerr_client.post(f"{settings.JELLYSEERR_URL}/api/v1/request", json=payload, headers=jellyseerr_headers)
         log.info(f"Jellyseerr response: {response.status_code} {response.text}")
         if response.status_code == 409:
             await cq.answer("Уже запрошено или доступно", show_alert=True)
@@ -138,6 +210,8 @@ async def media_req(_, cq: CallbackQuery):
             await cq.answer("Запрос принят!", show_alert=True)
         else:
             await cq.answer(f"Ошибка {response.status_code}", show_alert=True)
+    except UpstreamUnavailable:
+        await cq.answer(t("service_unavailable"), show_alert=True)
     except Exception as e:
         log.error(f"Error sending request: {e}")
         await cq.answer(t("request_error"), show_alert=True)
@@ -152,7 +226,7 @@ async def season_req(_, cq: CallbackQuery):
         payload["seasons"] = [int(season)]
     log.info(f"Sending TV request: {payload}")
     try:
-        response = await http_client.post(f"{settings.JELLYSEERR_URL}/api/v1/request", json=payload, headers=jellyseerr_headers)
+        response = await jellyseerr_client.post(f"{settings.JELLYSEERR_URL}/api/v1/request", json=payload, headers=jellyseerr_headers)
         log.info(f"Jellyseerr response: {response.status_code} {response.text}")
         if response.status_code == 409:
             await cq.answer("Уже запрошено или доступно", show_alert=True)
@@ -160,6 +234,8 @@ async def season_req(_, cq: CallbackQuery):
             await cq.answer(t("request_success_season" if season != "all" else "request_success", season=season), show_alert=True)
         else:
             await cq.answer(f"Ошибка {response.status_code}", show_alert=True)
+    except UpstreamUnavailable:
+        await cq.answer(t("service_unavailable"), show_alert=True)
     except Exception as e:
         log.error(f"Error sending season request: {e}")
         await cq.answer(t("request_error"), show_alert=True)
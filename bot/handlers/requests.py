@@ -6,17 +6,61 @@ from pyrogram.enums import ParseMode
 
 from bot import app
 from config import settings
-from bot.services.http_clients import http_client, jellyseerr_headers
+from bot.services.http_clients import jellyseerr_client, jellyseerr_headers
 from bot.services.database import get_linked_user
-from bot.helpers.formatting import format_request_item
+from bot.helpers.formatting import format_request_item, prefetch_media_details
 from bot.helpers.markup import create_requests_pagination_markup
+from bot.services.request_cache import RequestRecord, request_cache, slim_requests
+from bot.services.result_sessions import ResultSession
+from bot.services.poster_cache import send_with_poster
+from bot.services.resilience import UpstreamUnavailable
+from bot.services.background import spawn_background
 from bot.i18n import t
 
 log = logging.getLogger(__name__)
 
-# Кэш запросов (как в оригинале, но через app)
-if not hasattr(app, "request_cache"):
-    app.request_cache = {}
+
+def _prefetch_details(user_requests_data: list):
+    """Warms the media details cache for the next pages in the background."""
+    spawn_background(
+        prefetch_media_details(
+            user_requests_data,
+            settings.DETAILS_PREFETCH_COUNT,
+            settings.DETAILS_PREFETCH_CONCURRENCY,
+        )
+    )
+
+
+async def _fetch_requests_page(jellyseerr_user_id, page: int) -> tuple[list[RequestRecord], int, int]:
+    """One page of a user's requests, newest first, their total count and the page count."""
+    size = settings.REQUESTS_PAGE_SIZE
+    response = await jellyseerr_client.get(
+        f"{settings.JELLYSEERR_URL}/api/v1/request",
+        headers=jellyseerr_headers,
+        params={
+            "take": size,
+            "skip": (page - 1) * size,
+            "sort": "added",
+            "filter": "all",
+            "requestedBy": jellyseerr_user_id,
+        },
+    )
+    response.raise_for_status()
+    data = response.json()
+    records = slim_requests(data.get("results", []))
+    _prefetch_details(records)
+    page_info = data.get("pageInfo") or {}
+    return records, page_info.get("results", len(records)), page_info.get("pages", 1)
+
+
+async def _open_requests(user_id: str, jellyseerr_user_id) -> ResultSession:
+    """Loads the first page of /requests and caches the lazily paged view."""
+    records, total, pages = await _fetch_requests_page(jellyseerr_user_id, 1)
+    session = ResultSession(
+        int(user_id), records, total, lambda page: _fetch_requests_page(jellyseerr_user_id, page), pages
+    )
+    request_cache.set(user_id, session)
+    return session
 
 
 # =========================
@@ -38,51 +82,43 @@ async def my_requests_cmd(_: Client, message: Message):
     jellyseerr_user_id = linked_user[0]
 
     try:
-        request_api_url = f"{settings.JELLYSEERR_URL}/api/v1/request"
-        params = {
-            "take": 100,
-            "skip": 0,
-            "sort": "added",
-            "filter": "all",
-            "requestedBy": jellyseerr_user_id,
-        }
+        # Грузим только первую страницу; остальные — по мере листания
+        requests_view = await _open_requests(user_id, jellyseerr_user_id)
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        log.error(f"Failed to fetch requests: {e}")
+        # Jellyseerr недоступен — показываем последний известный список
+        requests_view = request_cache.get_stale(user_id)
+        if requests_view is None:
+            await sent_message.edit(
+                t("service_unavailable" if isinstance(e, UpstreamUnavailable) else "generic_network_error")
+            )
+            return
 
-        response = await http_client.get(
-            request_api_url,
-            headers=jellyseerr_headers,
-            params=params,
+    try:
+        # Из устаревшего списка первая страница могла выпасть из окна — тогда это снова запрос
+        first = await requests_view.get(0)
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        log.error(f"Failed to load the first page of requests: {e}")
+        await sent_message.edit(
+            t("service_unavailable" if isinstance(e, UpstreamUnavailable) else "generic_network_error")
         )
-        response.raise_for_status()
-        user_requests_data = response.json().get("results", [])
-
-    except httpx.RequestError as e:
-        log.error(f"Failed to fetch requests: {e}")
-        await sent_message.edit(t("generic_network_error"))
         return
-
-    if not user_requests_data:
+    if first is None:
         await sent_message.edit(t("no_requests"))
         return
 
-    # Сортируем как в оригинале
-    user_requests_data.sort(key=lambda r: r.get("createdAt", ""), reverse=True)
-
-    # Кладём в кэш
-    app.request_cache[user_id] = user_requests_data
-
-    text, photo_url = await format_request_item(
-        user_requests_data[0], 0, len(user_requests_data)
-    )
-    markup = create_requests_pagination_markup(
-        int(user_id), 0, len(user_requests_data)
-    )
+    text, photo_url = await format_request_item(first, 0, requests_view.total)
+    markup = create_requests_pagination_markup(int(user_id), 0, requests_view.total)
 
     if photo_url:
-        await message.reply_photo(
-            photo=photo_url,
-            caption=text,
-            reply_markup=markup,
-            parse_mode=ParseMode.HTML,
+        await send_with_poster(
+            photo_url,
+            lambda media: message.reply_photo(
+                photo=media,
+                caption=text,
+                reply_markup=markup,
+                parse_mode=ParseMode.HTML,
+            ),
         )
         await sent_message.delete()
     else:
@@ -107,66 +143,56 @@ async def requests_pagination_handler(_: Client, cq: CallbackQuery):
         await cq.answer(t("requests_not_yours"), show_alert=True)
         return
 
-    user_requests_data = app.request_cache.get(user_id)
-
-    # Если кэша нет — догружаем (как в оригинале)
-    if not user_requests_data:
-        linked_user = await get_linked_user(user_id)
-        if not linked_user:
-            await cq.answer(t("request_callback_need_link"), show_alert=True)
-            return
+    new_index = current_index + (1 if direction == "next" else -1)
+    requests_view = request_cache.get(user_id)
 
-        try:
-            response = await http_client.get(
-                f"{settings.JELLYSEERR_URL}/api/v1/request",
-                headers=jellyseerr_headers,
-                params={
-                    "take": 100,
-                    "skip": 0,
-                    "sort": "added",
-                    "filter": "all",
-                    "requestedBy": linked_user[0],
-                },
-            )
-            response.raise_for_status()
-            user_requests_data = response.json().get("results", [])
-            user_requests_data.sort(
-                key=lambda r: r.get("createdAt", ""), reverse=True
-            )
-            app.request_cache[user_id] = user_requests_data
+    try:
+        # Если кэша нет — открываем список заново (как в оригинале)
+        if requests_view is None:
+            linked_user = await get_linked_user(user_id)
+            if not linked_user:
+                await cq.answer(t("request_callback_need_link"), show_alert=True)
+                return
+            try:
+                requests_view = await _open_requests(user_id, linked_user[0])
+            except Exception:
+                # Jellyseerr недоступен — листаем последний известный список
+                requests_view = request_cache.get_stale(user_id)
+                if requests_view is None:
+                    raise
+        item = await requests_view.get(new_index)
 
-        except Exception as e:
-            log.error(f"Error re-fetching requests: {e}")
-            await cq.answer(t("generic_network_error"), show_alert=True)
-            return
+    except Exception as e:
+        log.error(f"Error fetching requests page: {e}")
+        await cq.answer(
+            t("service_unavailable" if isinstance(e, UpstreamUnavailable) else "generic_network_error"),
+            show_alert=True,
+        )
+        return
 
-    if not user_requests_data:
+    if requests_view.total == 0:
         await cq.answer(t("no_requests"), show_alert=True)
         return
 
-    new_index = current_index + (1 if direction == "next" else -1)
-
-    if not (0 <= new_index < len(user_requests_data)):
+    if item is None:
         await cq.answer(t("end_of_list"))
         return
 
-    item = user_requests_data[new_index]
-    text, photo_url = await format_request_item(
-        item, new_index, len(user_requests_data)
-    )
-    markup = create_requests_pagination_markup(
-        int(user_id), new_index, len(user_requests_data)
-    )
+    text, photo_url = await format_request_item(item, new_index, requests_view.total)
+    markup = create_requests_pagination_markup(int(user_id), new_index, requests_view.total)
 
     try:
         if photo_url:
-            await cq.edit_message_media(
-                media=InputMediaPhoto(
-                    media=photo_url,
-                    caption=text,
-                    parse_mode=ParseMode.HTML,
+            await send_with_poster(
+                photo_url,
+                lambda media: cq.edit_message_media(
+                    media=InputMediaPhoto(
+                        media=media,
+                        caption=text,
+                        parse_mode=ParseMode.HTML,
+                    ),
+                    reply_markup=markup,
                 ),
-                reply_markup=markup,
             )
         else:
             await cq.edit_message_caption(
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import html
 from pyrogram import filters, Client
@@ -6,14 +7,20 @@ from pyrogram.enums import ParseMode
 
 from bot import app
 from config import settings
-from bot.services.http_clients import http_client, jellyfin_headers
-from bot.services.database import get_linked_user
+from bot.services.database import get_linked_user, get_watch_aggregate
+from bot.services.dispatcher import heavy
+from bot.services.watch_history import fetch_played_summary, sync_watch_history
+from bot.services.resilience import UpstreamUnavailable
 from bot.i18n import t
 
 log = logging.getLogger(__name__)
 
+# Jellyfin RunTimeTicks: 10 000 000 тиков в секунду
+TICKS_PER_MINUTE = 10_000_000 * 60
+
 
 @app.on_message(filters.command("watch", prefixes="/") & filters.private)
+@heavy
 async def watch_stats_cmd(_: Client, m: Message):
     log.info(f"User {m.from_user.id} called /watch")
 
@@ -35,48 +42,22 @@ async def watch_stats_cmd(_: Client, m: Message):
         return
 
     # ─────────────────────────────────────────────
-    # Получаем просмотренные элементы пользователя
-    # Используем официальный Jellyfin API
+    # Количество и последний просмотренный тайтл
+    # считает сам Jellyfin (TotalRecordCount, SortBy=DatePlayed)
     # ─────────────────────────────────────────────
-    items_url = f"{settings.JELLYFIN_URL}/Users/{jellyfin_user_id}/Items"
-    params = {
-        "Recursive": "true",
-        "IncludeItemTypes": "Movie,Episode",
-        "Filters": "IsPlayed",
-        "Fields": "UserData,SeriesName",
-    }
-
     try:
-        response = await http_client.get(
-            items_url,
-            headers=jellyfin_headers,
-            params=params,
-        )
-        log.info(f"/watch API response: {response.status_code}")
-        response.raise_for_status()
-        items = response.json().get("Items", [])
+        watched_count, item = await fetch_played_summary(jellyfin_user_id)
+    except UpstreamUnavailable:
+        await sent_message.edit(t("service_unavailable"))
+        return
     except Exception as e:
         await sent_message.edit(t("generic_network_error"))
         log.error(f"Error fetching watch stats: {e}")
         return
 
-    # ─────────────────────────────────────────────
-    # Количество просмотренных элементов
-    # ─────────────────────────────────────────────
-    watched_count = len(items)
-
-    # ─────────────────────────────────────────────
-    # Последний просмотренный тайтл
-    # (по LastPlayedDate)
-    # ─────────────────────────────────────────────
     last_watched_title = t("no_last_watched")
 
-    if items:
-        items.sort(
-            key=lambda x: x.get("UserData", {}).get("LastPlayedDate", ""),
-            reverse=True,
-        )
-        item = items[0]
+    if item:
         title = item.get("Name", "Unknown")
 
         if item.get("Type") == "Episode":
@@ -86,6 +67,29 @@ async def watch_stats_cmd(_: Client, m: Message):
 
         last_watched_title = html.escape(title)
 
+    # ─────────────────────────────────────────────
+    # Общее время — из локального агрегата,
+    # который догружается инкрементально
+    # ─────────────────────────────────────────────
+    sync = sync_watch_history(jellyfin_user_id, watched_count)
+    try:
+        await asyncio.wait_for(asyncio.shield(sync), timeout=settings.WATCH_SYNC_WAIT)
+    except Exception:
+        # Долгая первая синхронизация продолжается в фоне
+        pass
+
+    local_count, total_ticks, synced_at = await get_watch_aggregate(jellyfin_user_id)
+    if synced_at is not None and local_count == watched_count:
+        minutes_total = total_ticks // TICKS_PER_MINUTE
+        watch_time_line = t(
+            "watch_total_time",
+            days=minutes_total // (60 * 24),
+            hours=minutes_total // 60 % 24,
+            minutes=minutes_total % 60,
+        )
+    else:
+        watch_time_line = t("watch_time_syncing")
+
     # ─────────────────────────────────────────────
     # Формирование ответа
     # ─────────────────────────────────────────────
@@ -95,7 +99,7 @@ async def watch_stats_cmd(_: Client, m: Message):
         f"📊 <b>{username_html}'s Watch Statistics</b>\n\n"
         f"<b>📺 Total Watched Items:</b> {watched_count}\n"
         f"<b>👀 Last Watched:</b> {last_watched_title}\n\n"
-        f"<i>Полное время просмотра недоступно без user token</i>"
+        f"<i>{watch_time_line}</i>"
     )
 
     await sent_message.edit(text, parse_mode=ParseMode.HTML)
@@ -4,8 +4,15 @@ from pyrogram.types import Message
 from pyrogram.enums import ParseMode
 from bot import app
 from config import settings
-from bot.services.http_clients import http_client, jellyfin_headers, jellyseerr_headers
-from bot.services.database import store_linked_user, get_linked_user, delete_linked_user
+from bot.services.http_clients import jellyfin_client, jellyfin_headers
+from bot.services.database import (
+    store_linked_user,
+    get_linked_user,
+    delete_linked_user,
+    find_directory_user_by_jellyfin_id,
+)
+from bot.services.user_directory import find_jellyseerr_user_id
+from bot.services.resilience import UpstreamUnavailable
 from bot.services.user_state import user_states, UserState
 from bot.i18n import t
 
@@ -13,7 +20,7 @@ log = logging.getLogger(__name__)
 
 @app.on_message(filters.command("link") & filters.private)
 async def link_cmd(_, m: Message):
-    user_states.set(m.from_user.id, UserState.LINK_CREDENTIALS)
+    await user_states.set(m.from_user.id, UserState.LINK_CREDENTIALS)
     await m.reply(
         "🔗 <b>Привязка аккаунта Jellyfin</b>\n\n"
         "📝 Отправьте следующим сообщением:\n"
@@ -24,13 +31,13 @@ async def link_cmd(_, m: Message):
     )
 
 async def _handle_link_credentials(m: Message):
-    current_state = user_states.get(m.from_user.id)
+    current_state = await user_states.get(m.from_user.id)
     if current_state != UserState.LINK_CREDENTIALS:
         log.debug(f"Unexpected call to _handle_link_credentials for user {m.from_user.id}, state: {current_state}")
         return
 
     # Теперь очищаем состояние
-    user_states.clear(m.from_user.id)
+    await user_states.clear(m.from_user.id)
 
     text = m.text.strip()
     parts = text.split(maxsplit=1)
@@ -44,7 +51,7 @@ async def _handle_link_credentials(m: Message):
     status_msg = await m.reply("🔄 <i>Проверяю логин и пароль...</i>", parse_mode=ParseMode.HTML)
 
     try:
-        auth_response = await http_client.post(
+        auth_response = await jellyfin_client.post(
             f"{settings.JELLYFIN_URL}/Users/AuthenticateByName",
             json={"Username": username, "Pw": password},
             headers=jellyfin_headers
@@ -60,18 +67,9 @@ async def _handle_link_credentials(m: Message):
         jellyfin_user_id = auth_response.json()["User"]["Id"]
         log.info(f"Authenticated Jellyfin user ID: {jellyfin_user_id}")
 
-        users_response = await http_client.get(
-            f"{settings.JELLYSEERR_URL}/api/v1/user?take=1000",
-            headers=jellyseerr_headers
-        )
-        users_response.raise_for_status()
-        users = users_response.json().get("results", [])
-        jellyseerr_user = next(
-            (u for u in users if str(u.get("jellyfinUserId")) == str(jellyfin_user_id)),
-            None
-        )
+        jellyseerr_user_id = await find_jellyseerr_user_id(jellyfin_user_id)
 
-        if not jellyseerr_user:
+        if not jellyseerr_user_id:
             await status_msg.edit(
                 "❌ <b>Аккаунт найден в Jellyfin, но не импортирован в Jellyseerr</b>\n"
                 "Обратитесь к администратору."
@@ -79,11 +77,12 @@ async def _handle_link_credentials(m: Message):
             log.warning(f"Jellyseerr user not found for Jellyfin ID {jellyfin_user_id}")
             return
 
+        directory_entry = await find_directory_user_by_jellyfin_id(jellyfin_user_id)
         await store_linked_user(
             telegram_id=str(m.from_user.id),
-            jellyseerr_user_id=str(jellyseerr_user["id"]),
+            jellyseerr_user_id=jellyseerr_user_id,
             jellyfin_user_id=str(jellyfin_user_id),
-            username=jellyseerr_user.get("username") or username
+            username=(directory_entry and directory_entry[2]) or username
         )
 
         await status_msg.edit(
@@ -91,8 +90,10 @@ async def _handle_link_credentials(m: Message):
             "Теперь вы можете запрашивать медиа, смотреть запросы и статистику.",
             parse_mode=ParseMode.HTML
         )
-        log.info(f"Successfully linked user {m.from_user.id} to Jellyseerr ID {jellyseerr_user['id']}")
+        log.info(f"Successfully linked user {m.from_user.id} to Jellyseerr ID {jellyseerr_user_id}")
 
+    except UpstreamUnavailable:
+        await status_msg.edit(t("service_unavailable"))
     except Exception as e:
         log.error(f"Link error for user {m.from_user.id}: {str(e)}", exc_info=True)
         await status_msg.edit("❌ <b>Ошибка при привязке</b>\nПопробуйте позже или проверьте данные.")
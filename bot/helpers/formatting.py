@@ -1,13 +1,74 @@
+import asyncio
 import html
 import logging
 logger = logging.getLogger(__name__)
 
 from config import settings
-from bot.services.http_clients import http_client, jellyseerr_headers
+from bot.services.cache import TTLCache
+from bot.services.http_clients import FAST_TIMEOUT, jellyseerr_client, jellyseerr_headers
+from bot.services.request_cache import RequestRecord
 from bot.i18n import t
 
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
 
+# (endpoint, tmdb_id) -> только те поля, которые мы показываем
+details_cache = TTLCache(
+    "media_details", settings.DETAILS_CACHE_SIZE, settings.DETAILS_CACHE_TTL
+)
+
+
+def _details_key(media_type: str, tmdb_id) -> tuple[str, int]:
+    return ("tv" if media_type == "tv" else "movie", int(tmdb_id))
+
+
+async def _fetch_media_details(endpoint: str, tmdb_id: int) -> dict:
+    url = f"{settings.JELLYSEERR_URL}/api/v1/{endpoint}/{tmdb_id}"
+    resp = await jellyseerr_client.get(url, headers=jellyseerr_headers, timeout=FAST_TIMEOUT)
+    resp.raise_for_status()
+    info = resp.json()
+    return {
+        "title": info.get("name") or info.get("title") or "Неизвестно",
+        "year": (info.get("firstAirDate") or info.get("releaseDate") or "")[:4] or "—",
+        "posterPath": info.get("posterPath"),
+    }
+
+
+def invalidate_media_details(media_type: str, tmdb_id):
+    """Drops cached details after Jellyseerr or Jellyfin reported a change."""
+    details_cache.invalidate(_details_key(media_type, tmdb_id))
+
+
+async def get_media_details(media_type: str, tmdb_id) -> dict:
+    """Slim movie/TV details, shared by every user and page render."""
+    key = _details_key(media_type, tmdb_id)
+    return await details_cache.get_or_load(
+        key, lambda: _fetch_media_details(*key), stale_on_error=True
+    )
+
+
+async def prefetch_media_details(
+    requests: list[RequestRecord], limit: int, concurrency: int
+):
+    """Warms details_cache for the first `limit` requests, `concurrency` at a time."""
+    keys = []
+    for request in requests[:limit]:
+        if not request.tmdb_id:
+            continue
+        key = _details_key(request.media_type, request.tmdb_id)
+        if key not in details_cache and key not in keys:
+            keys.append(key)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def warm(key):
+        async with semaphore:
+            try:
+                await get_media_details(*key)
+            except Exception as e:
+                logger.debug(f"Prefetch of {key} failed: {e}")
+
+    await asyncio.gather(*(warm(key) for key in keys))
+
 def format_media_item(item: dict, current_index: int, total_results: int) -> tuple[str, str]:
     logger.info(f"Formatting item: {item.get('name', 'No name')} | Source: {item.get('source', 'unknown')}")
 
@@ -55,25 +116,20 @@ def format_media_item(item: dict, current_index: int, total_results: int) -> tup
     logger.info(f"Final photo URL: '{photo_url}'")
     return text, photo_url
 
-async def format_request_item(request: dict, current_index: int, total_results: int) -> tuple[str, str]:
-    media = request.get("media", {})
-    media_type = media.get("mediaType", "unknown")
-    tmdb_id = media.get("tmdbId")
+async def format_request_item(request: RequestRecord, current_index: int, total_results: int) -> tuple[str, str]:
+    media_type = request.media_type
+    tmdb_id = request.tmdb_id
     if not tmdb_id:
         return "<b>Ошибка: нет TMDB ID</b>", ""
 
     try:
-        endpoint = "tv" if media_type == "tv" else "movie"
-        url = f"{settings.JELLYSEERR_URL}/api/v1/{endpoint}/{tmdb_id}"
-        resp = await http_client.get(url, headers=jellyseerr_headers)
-        resp.raise_for_status()
-        info = resp.json()
+        info = await get_media_details(media_type, tmdb_id)
     except Exception:
         return "<b>Ошибка загрузки деталей</b>", ""
 
-    title = info.get("name") or info.get("title") or "Неизвестно"
-    year = (info.get("firstAirDate") or info.get("releaseDate") or "")[:4] or "—"
-    status = request.get("status", 0)
+    title = info["title"]
+    year = info["year"]
+    status = request.status
     status_text = {
         1: "Ожидает ⏳",
         2: "Одобрено ✅",
@@ -81,7 +137,7 @@ async def format_request_item(request: dict, current_index: int, total_results:
         4: "Частично доступно 📦",
         5: "Доступно 🎬",
     }.get(status, "Неизвестно ❓")
-    date = (request.get("createdAt") or "")[:10]
+    date = request.created_at[:10]
 
     text = (
         f"<b>{html.escape(title)} ({year})</b>\n\n"
@@ -93,4 +149,3 @@ async def format_request_item(request: dict, current_index: int, total_results:
     poster = info.get("posterPath")
     photo_url = f"{TMDB_IMAGE_BASE}{poster}" if poster else ""
     return text, photo_url
-formatting.py
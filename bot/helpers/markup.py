@@ -2,18 +2,18 @@ from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from bot.i18n import t
 
 
-def create_media_pagination_markup(query, current_index, total_results, media_type, tmdb_id):
+def create_media_pagination_markup(session_id, current_index, total_results, media_type, tmdb_id):
     buttons = []
     nav = []
 
-    # Кнопки навигации ← →
+    # Кнопки навигации ← →: id сессии с результатами и индекс, на который перейти
     nav.append(
-        InlineKeyboardButton("⬅️", callback_data=f"media_nav:prev:{current_index}:{query}")
+        InlineKeyboardButton("⬅️", callback_data=f"media_nav:{session_id}:{current_index - 1}")
         if current_index > 0
         else InlineKeyboardButton(" ", callback_data="noop")
     )
     nav.append(
-        InlineKeyboardButton("➡️", callback_data=f"media_nav:next:{current_index}:{query}")
+        InlineKeyboardButton("➡️", callback_data=f"media_nav:{session_id}:{current_index + 1}")
         if current_index < total_results - 1
         else InlineKeyboardButton(" ", callback_data="noop")
     )
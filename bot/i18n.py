@@ -1,53 +1,193 @@
 import os
 import json
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from string import Formatter
 import logging
 
+from bot.services.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_LANG = os.getenv("LANGUAGE", "ru").lower()
+FALLBACK_LANG = "en"
 LOCALES_PATHS = [
     Path("/config/locales"),
     Path("/app/locales"),
     Path(__file__).parent.parent / "locales",
 ]
 
-_loaded_locales = {}
 
+class _Template:
+    """A catalog string with {placeholders}, checked once at load time."""
+
+    __slots__ = ("text", "fields")
+
+    def __init__(self, text: str, fields: frozenset[str]):
+        self.text = text
+        self.fields = fields
+
+    def render(self, kwargs: dict) -> str:
+        try:
+            return self.text.format_map(kwargs)
+        except Exception:
+            return self.text
+
+
+def _compile(lang: str, key: str, text) -> str | _Template:
+    """Plain strings stay str; strings with fields become a _Template."""
+    try:
+        fields = frozenset(
+            name.split(".", 1)[0].split("[", 1)[0]
+            for _, name, _, _ in Formatter().parse(text)
+            if name is not None
+        )
+    except ValueError as e:
+        # Битый шаблон выводим как есть — так же, как раньше при ошибке format()
+        logger.error(f"Locale '{lang}': '{key}' is not a valid template ({e}), shown verbatim")
+        return text
+    if not fields:
+        return text
+    if "" in fields or any(name.isdigit() for name in fields):
+        logger.warning(f"Locale '{lang}': '{key}' uses positional fields; t() only passes keywords")
+    return _Template(text, fields)
 
-def _load_locale(lang: str):
-    if lang in _loaded_locales:
-        return _loaded_locales[lang]
 
+def _read_catalogs() -> dict[str, dict]:
+    """lang -> raw catalog; a file in an earlier LOCALES_PATHS entry wins."""
+    raw = {}
     for base in LOCALES_PATHS:
-        path = base / f"{lang}.json"
-        if path.exists():
+        if not base.is_dir():
+            continue
+        for path in sorted(base.glob("*.json")):
+            lang = path.stem.lower()
+            if lang in raw:
+                continue
             try:
                 with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    _loaded_locales[lang] = data
-                    logger.info(f"Locale '{lang}' loaded from {path}")
-                    return data
+                    raw[lang] = json.load(f)
+                logger.info(f"Locale '{lang}' loaded from {path}")
             except Exception as e:
                 logger.error(f"Failed to load locale {path}: {e}")
+    return raw
 
-    if lang != "en":
-        logger.warning(f"Locale '{lang}' not found – falling back to 'en'")
-        return _load_locale("en")
 
-    _loaded_locales["en"] = {}
-    return {}
+def load_locales() -> dict[str, dict[str, str | _Template]]:
+    """Loads and compiles every catalog and reports gaps between them once.
 
+    Each compiled catalog already includes its fallbacks (the default
+    language, then English), so t() is a single dict lookup.
+    """
+    raw = _read_catalogs()
+    compiled = {}
+    for lang, catalog in raw.items():
+        compiled[lang] = {}
+        for key, text in catalog.items():
+            if isinstance(text, str):
+                compiled[lang][key] = _compile(lang, key, text)
+            else:
+                logger.error(f"Locale '{lang}': '{key}' is not a string, ignored")
 
-def t(key: str, **kwargs):
-    lang = os.getenv("LANGUAGE", DEFAULT_LANG).lower()
-    locale = _load_locale(lang)
-    text = locale.get(key)
-    if text is None and lang != "en":
-        text = _load_locale("en").get(key)
-    if text is None:
-        text = key
+    if DEFAULT_LANG not in compiled:
+        logger.warning(f"Locale '{DEFAULT_LANG}' not found – falling back to '{FALLBACK_LANG}'")
+    base = {**compiled.get(FALLBACK_LANG, {}), **compiled.get(DEFAULT_LANG, {})}
+    reference = compiled.get(DEFAULT_LANG) or compiled.get(FALLBACK_LANG, {})
+
+    catalogs = {}
+    for lang, catalog in compiled.items():
+        missing = reference.keys() - catalog.keys()
+        if missing:
+            logger.warning(
+                f"Locale '{lang}' lacks {len(missing)} keys, using '{DEFAULT_LANG}' for them: "
+                f"{', '.join(sorted(missing))}"
+            )
+        for key, template in catalog.items():
+            expected = reference.get(key)
+            if expected is not None and _fields(template) != _fields(expected):
+                logger.warning(f"Locale '{lang}': placeholders of '{key}' differ from '{DEFAULT_LANG}'")
+        catalogs[lang] = {**base, **catalog}
+    catalogs.setdefault(DEFAULT_LANG, base)
+    return catalogs
+
+
+def _fields(template) -> frozenset[str]:
+    return template.fields if isinstance(template, _Template) else frozenset()
+
+
+_catalogs = load_locales()
+# Каталог текущего апдейта; выставляет localize_handler
+_current: ContextVar[dict] = ContextVar("locale", default=_catalogs[DEFAULT_LANG])
+_reported_missing: set[str] = set()
+# user_id -> (language_code из Telegram, выбранная локаль)
+_user_locales = TTLCache("user_locales", 50_000, 24 * 3600)
+
+
+def resolve_locale(language_code: str | None) -> str:
+    """Maps a Telegram language_code ("pt-br", "en") to a loaded locale."""
+    if not language_code:
+        return DEFAULT_LANG
+    code = language_code.lower().replace("_", "-")
+    if code in _catalogs:
+        return code
+    code = code.split("-", 1)[0]
+    return code if code in _catalogs else DEFAULT_LANG
+
+
+def user_locale(user_id: int, language_code: str | None = None) -> str:
+    """The locale for a user, remembered so background messages can use it too.
+
+    Without language_code (no incoming update), returns the last locale
+    seen for that user, or the default one.
+    """
+    cached = _user_locales.get(user_id)
+    if cached is not None and (language_code is None or cached[0] == language_code):
+        return cached[1]
+    if language_code is None:
+        return DEFAULT_LANG
+    locale = resolve_locale(language_code)
+    _user_locales.set(user_id, (language_code, locale))
+    return locale
+
+
+@contextmanager
+def use_locale(locale: str):
+    """Makes t() inside the block use `locale` (e.g. for a DM sent from a task)."""
+    token = _current.set(_catalogs.get(locale, _catalogs[DEFAULT_LANG]))
     try:
-        return text.format(**kwargs) if kwargs else text
-    except Exception:
-        return text
+        yield
+    finally:
+        _current.reset(token)
+
+
+def localize_handler(callback):
+    """Wraps a Pyrogram handler callback so t() answers in the sender's language."""
+
+    @functools.wraps(callback)
+    async def wrapper(client, update, *args):
+        user = getattr(update, "from_user", None)
+        locale = user_locale(user.id, user.language_code) if user is not None else DEFAULT_LANG
+        token = _current.set(_catalogs[locale])
+        try:
+            return await callback(client, update, *args)
+        finally:
+            _current.reset(token)
+
+    return wrapper
+
+
+def _missing(key: str) -> str:
+    if key not in _reported_missing:
+        _reported_missing.add(key)
+        logger.warning(f"Missing translation key '{key}'")
+    return key
+
+
+def t(key: str, **kwargs):
+    template = _current.get().get(key)
+    if template is None:
+        return _missing(key)
+    if type(template) is str:
+        return template
+    return template.render(kwargs) if kwargs else template.text
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Coroutine
+
+logger = logging.getLogger(__name__)
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_tasks: set[asyncio.Task] = set()
+
+
+def spawn_background(coro: Coroutine) -> asyncio.Task:
+    """Runs `coro` fire-and-forget: keeps the task alive and logs its failure."""
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_coro().__qualname__} failed", exc_info=task.exception())
+
+
+class PeriodicTask:
+    """Runs `job` every `interval` seconds in the background until stopped.
+
+    A failed run is logged and the loop goes on. With `run_first` the
+    first run happens at start(), otherwise after one interval.
+    """
+
+    def __init__(self, name: str, job: Callable[[], Awaitable], interval: float, run_first: bool = True):
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.run_first = run_first
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        if not self.run_first:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.job()
+            except Exception as e:
+                logger.error(f"{self.name} failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
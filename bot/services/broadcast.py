@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+
+from pyrogram import Client
+from pyrogram.enums import ParseMode
+
+from config import settings
+from bot.i18n import t, use_locale, user_locale
+from bot.services.database import (
+    create_broadcast,
+    finish_broadcast,
+    get_broadcast_recipients,
+    get_running_broadcasts,
+    save_broadcast_progress,
+)
+from bot.services.send_queue import bulk_sends
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """A /broadcast in progress; mirrors one row of the broadcasts table."""
+
+    __slots__ = (
+        "id", "chat_id", "status_message_id", "text", "total",
+        "last_telegram_id", "sent", "failed", "stop_requested",
+    )
+
+    def __init__(self, id, chat_id, status_message_id, text, total, last_telegram_id="", sent=0, failed=0):
+        self.id = id
+        self.chat_id = chat_id
+        self.status_message_id = status_message_id
+        self.text = text
+        self.total = total
+        self.last_telegram_id = last_telegram_id
+        self.sent = sent
+        self.failed = failed
+        self.stop_requested = False
+
+
+# broadcast id -> (рассылка, её задача)
+_running: dict[int, tuple[Broadcast, asyncio.Task]] = {}
+
+
+async def _deliver(client: Client, telegram_id: str, text: str) -> bool:
+    try:
+        await client.send_message(int(telegram_id), text, parse_mode=ParseMode.HTML)
+        return True
+    except Exception as e:
+        # Заблокировал бота, удалил аккаунт и т.п.; FloodWait уже обработал send_scheduler
+        logger.debug(f"Broadcast to {telegram_id} failed: {e!r}")
+        return False
+
+
+async def _show_progress(client: Client, broadcast: Broadcast, key: str):
+    with use_locale(user_locale(broadcast.chat_id)):
+        text = t(key, sent=broadcast.sent, failed=broadcast.failed, total=broadcast.total)
+    try:
+        await client.edit_message_text(broadcast.chat_id, broadcast.status_message_id, text)
+    except Exception as e:
+        logger.debug(f"Could not update broadcast {broadcast.id} progress: {e!r}")
+
+
+async def _run(client: Client, broadcast: Broadcast):
+    """Sends to every linked user after last_telegram_id, one batch at a time.
+
+    Recipients are read in telegram_id order with keyset paging, so memory
+    stays at one batch however many users there are. Progress is saved
+    after every batch; after a restart the broadcast continues from there
+    (at worst the interrupted batch is sent again).
+    """
+    last_shown = time.monotonic()
+    try:
+        while not broadcast.stop_requested:
+            batch = await get_broadcast_recipients(broadcast.last_telegram_id, settings.BROADCAST_BATCH_SIZE)
+            if not batch:
+                break
+            # Темп задаёт send_scheduler: рассылка идёт после ответов пользователям
+            with bulk_sends():
+                results = await asyncio.gather(*(_deliver(client, tid, broadcast.text) for tid in batch))
+            delivered = sum(results)
+            broadcast.sent += delivered
+            broadcast.failed += len(results) - delivered
+            broadcast.last_telegram_id = batch[-1]
+            await save_broadcast_progress(
+                broadcast.id, broadcast.last_telegram_id, broadcast.sent, broadcast.failed
+            )
+            if time.monotonic() - last_shown >= settings.BROADCAST_PROGRESS_INTERVAL:
+                await _show_progress(client, broadcast, "broadcast_progress")
+                last_shown = time.monotonic()
+
+        status = "cancelled" if broadcast.stop_requested else "done"
+        await finish_broadcast(broadcast.id, status)
+        await _show_progress(client, broadcast, f"broadcast_{status}")
+        logger.info(
+            f"Broadcast {broadcast.id} {status}: {broadcast.sent} sent, {broadcast.failed} failed."
+        )
+    except asyncio.CancelledError:
+        # Остановка бота: статус остаётся running, продолжим после запуска
+        raise
+    except Exception as e:
+        logger.error(f"Broadcast {broadcast.id} stopped by an error, will resume on restart: {e}")
+    finally:
+        _running.pop(broadcast.id, None)
+
+
+def _launch(client: Client, broadcast: Broadcast):
+    _running[broadcast.id] = (broadcast, asyncio.create_task(_run(client, broadcast)))
+
+
+async def start_broadcast(client: Client, chat_id: int, status_message_id: int, text: str, total: int):
+    """Starts sending `text` (HTML) to every linked user, reporting into the status message."""
+    broadcast_id = await create_broadcast(chat_id, status_message_id, text, total)
+    _launch(client, Broadcast(broadcast_id, chat_id, status_message_id, text, total))
+
+
+def cancel_broadcasts() -> int:
+    """Asks running broadcasts to stop after the current batch; returns how many."""
+    for broadcast, _ in _running.values():
+        broadcast.stop_requested = True
+    return len(_running)
+
+
+async def resume_broadcasts(client: Client):
+    """Continues broadcasts that were running when the bot stopped."""
+    for row in await get_running_broadcasts():
+        broadcast = Broadcast(*row)
+        if broadcast.id in _running:
+            continue
+        logger.info(f"Resuming broadcast {broadcast.id} after {broadcast.last_telegram_id or 'start'}.")
+        _launch(client, broadcast)
+
+
+async def stop_broadcasts():
+    """Cancels broadcast tasks on shutdown, leaving them resumable."""
+    tasks = [task for _, task in _running.values()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
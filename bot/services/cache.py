@@ -0,0 +1,204 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from bot.services.metrics import CallbackMetric
+
+# name -> cache, for /metrics
+caches: dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """A bounded in-process cache with per-entry TTL and LRU eviction.
+
+    get_or_load() also collapses concurrent loads of the same key into a
+    single upstream call (single-flight): callers that arrive while a load
+    is running wait for its result instead of starting their own.
+
+    With a weigher, the cache also keeps the summed weight of its entries
+    (e.g. estimated bytes) under max_weight, evicting least recently used
+    entries first.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl: float,
+        max_weight: int | None = None,
+        weigher: Callable[[Any], int] | None = None,
+    ):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        caches[name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get(self, key: Hashable, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            # Просроченная запись остаётся до вытеснения — для get_stale()
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key: Hashable, default=None):
+        """Returns the entry even if it has expired (fallback when upstream is down)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        self.stale_hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value, ttl: float | None = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        weight = self.weigher(value) if self.weigher else 0
+        self._pop(key)
+        self._data[key] = (expires_at, value, weight)
+        self.weight += weight
+        while len(self._data) > self.maxsize or (
+            self.max_weight is not None
+            and self.weight > self.max_weight
+            and len(self._data) > 1
+        ):
+            oldest = next(iter(self._data))
+            self._pop(oldest)
+            self.evictions += 1
+
+    def _pop(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    def invalidate(self, key: Hashable):
+        self._pop(key)
+
+    def clear(self):
+        self._data.clear()
+        self.weight = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        stale_on_error: bool = False,
+    ):
+        """Returns the cached value or awaits loader() exactly once per key.
+
+        Exceptions from loader() are propagated to every waiter and are
+        never cached. With stale_on_error, an expired entry is returned
+        instead of the exception when there is one.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        try:
+            return await self._load(key, loader)
+        except Exception:
+            if stale_on_error:
+                value = self.get_stale(key, sentinel)
+                if value is not sentinel:
+                    return value
+            raise
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Помечаем исключение как полученное, если ожидающих не было
+            future.exception()
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "stale_hits": self.stale_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _lookup_samples():
+    for cache in caches.values():
+        yield (cache.name, "hit"), cache.hits
+        yield (cache.name, "miss"), cache.misses
+        yield (cache.name, "coalesced"), cache.coalesced
+        yield (cache.name, "stale"), cache.stale_hits
+
+
+CallbackMetric(
+    "tellyseerr_cache_lookups_total",
+    "Cache lookups by result.",
+    ("cache", "result"),
+    _lookup_samples,
+    type="counter",
+)
+CallbackMetric(
+    "tellyseerr_cache_hit_ratio",
+    "Share of lookups served from the cache.",
+    ("cache",),
+    lambda: (((c.name,), round(c.stats()["hit_rate"], 4)) for c in caches.values()),
+)
+CallbackMetric(
+    "tellyseerr_cache_entries",
+    "Entries currently held, expired ones included.",
+    ("cache",),
+    lambda: (((c.name,), len(c)) for c in caches.values()),
+)
+CallbackMetric(
+    "tellyseerr_cache_evictions_total",
+    "Entries evicted by size or weight limits.",
+    ("cache",),
+    lambda: (((c.name,), c.evictions) for c in caches.values()),
+    type="counter",
+)
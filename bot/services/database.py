@@ -1,15 +1,142 @@
 import aiosqlite
+import asyncio
+import functools
+import json
 import os
 import logging
 import secrets
 import string
-from datetime import datetime, timedelta
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from config import settings
+from bot.services.metrics import db_latency
+from bot.services.profiling import record_db
 
 DB_PATH = settings.DB_PATH
 logger = logging.getLogger(__name__)
 
 
+class ConnectionPool:
+    """A fixed-size pool of long-lived aiosqlite connections.
+
+    Each connection owns one worker thread and one SQLite handle for the
+    lifetime of the bot, so queries no longer pay for a new thread, a new
+    handle and a cold statement cache on every call.
+    """
+
+    def __init__(self, path: str, size: int, cached_statements: int):
+        self.path = path
+        self.size = max(1, size)
+        self.cached_statements = cached_statements
+        self._connections: list[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue | None = None
+
+    async def open(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            db = await aiosqlite.connect(
+                self.path, cached_statements=self.cached_statements
+            )
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            self._connections.append(db)
+            self._idle.put_nowait(db)
+
+    @asynccontextmanager
+    async def acquire(self):
+        db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            # Не возвращаем в пул соединение с незавершённой транзакцией
+            if db.in_transaction:
+                await db.rollback()
+            self._idle.put_nowait(db)
+
+    async def close(self):
+        for db in self._connections:
+            await db.close()
+        self._connections.clear()
+        self._idle = None
+
+
+_pool: ConnectionPool | None = None
+
+# Будит планировщик истечения доступа (tasks.py), когда меняется expires_at
+expiry_changed = asyncio.Event()
+
+
+@asynccontextmanager
+async def _connect():
+    """Yields a pooled connection, or a one-off one before init_db()/after close_db()."""
+    if _pool is None:
+        async with aiosqlite.connect(DB_PATH) as db:
+            yield db
+        return
+    async with _pool.acquire() as db:
+        yield db
+
+
+def _timed(func):
+    """Records the latency of a database helper under its name."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            db_latency.observe(elapsed, name)
+            record_db(elapsed)
+
+    return wrapper
+
+
+async def close_db():
+    """Closes every pooled connection. Called from main.stop_services."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+        logger.info("Database connection pool closed.")
+
+
+def _normalize_expires_at(value) -> str | None:
+    """expires_at as naive UTC ISO text, the one form the expiry queries compare.
+
+    Raises ValueError for values that are not ISO dates.
+    """
+    if value is None or value == "":
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="seconds")
+
+
+async def _normalize_stored_expiries(db):
+    """Rewrites expires_at saved before it was normalized on write."""
+    async with db.execute(
+        "SELECT telegram_id, expires_at FROM linked_users WHERE expires_at IS NOT NULL"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    for telegram_id, expires_at in rows:
+        try:
+            normalized = _normalize_expires_at(expires_at)
+        except (TypeError, ValueError):
+            logger.error(f"Invalid expires_at {expires_at!r} of user {telegram_id}, left as is")
+            continue
+        if normalized != expires_at:
+            await db.execute(
+                "UPDATE linked_users SET expires_at = ? WHERE telegram_id = ?",
+                (normalized, telegram_id),
+            )
+
+
 async def init_db():
     """Initializes the SQLite database asynchronously."""
 
@@ -22,8 +149,17 @@ async def init_db():
     elif not db_dir:
         logger.info("Database path is in the root directory. No directory to create.")
 
+    global _pool
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        if _pool is None:
+            pool = ConnectionPool(
+                DB_PATH, settings.DB_POOL_SIZE, settings.DB_STATEMENT_CACHE_SIZE
+            )
+            await pool.open()
+            _pool = pool
+            logger.info(f"Opened database pool with {pool.size} connections (WAL).")
+
+        async with _connect() as db:
             logger.info("Database connection successful. Creating tables...")
             
             # Основная таблица пользователей
@@ -40,6 +176,18 @@ async def init_db():
                 )
             """)
             
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_linked_users_expires_at ON linked_users (expires_at)"
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_linked_users_username ON linked_users (username)"
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_linked_users_jellyseerr_user_id ON linked_users (jellyseerr_user_id)"
+            )
+            # Планировщик сравнивает expires_at как строки — приводим старые записи к одному виду
+            await _normalize_stored_expiries(db)
+
             # Таблица инвайт-кодов
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS invite_codes (
@@ -72,6 +220,81 @@ async def init_db():
                 )
             """)
 
+            # Просмотренные элементы Jellyfin для агрегата /watch
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS watch_items (
+                    jellyfin_user_id TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    runtime_ticks INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (jellyfin_user_id, item_id)
+                ) WITHOUT ROWID
+            """)
+
+            # Отметка последней синхронизации истории просмотров
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS watch_sync (
+                    jellyfin_user_id TEXT PRIMARY KEY,
+                    synced_at TEXT NOT NULL
+                )
+            """)
+
+            # Локальный справочник пользователей Jellyfin/Jellyseerr
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS user_directory (
+                    jellyfin_user_id TEXT,
+                    jellyseerr_user_id TEXT,
+                    username TEXT,
+                    username_lower TEXT
+                )
+            """)
+            await db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_directory_jellyfin ON user_directory (jellyfin_user_id)"
+            )
+            await db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_directory_jellyseerr ON user_directory (jellyseerr_user_id)"
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_user_directory_username ON user_directory (username_lower)"
+            )
+
+            # Telegram file_id загруженных постеров TMDB
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS poster_file_ids (
+                    poster_url TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    file_unique_id TEXT NOT NULL
+                )
+            """)
+
+            # Состояния диалогов (/request, /link, /invite), если USER_STATE_PERSIST
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS user_states (
+                    user_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    data TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_user_states_expires_at ON user_states (expires_at)"
+            )
+
+            # Рассылки /broadcast: прогресс сохраняется, чтобы продолжить после перезапуска
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    status_message_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    last_telegram_id TEXT NOT NULL DEFAULT '',
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
             await db.commit()
             logger.info("Database tables created/verified successfully.")
 
@@ -79,15 +302,17 @@ async def init_db():
         logger.error(f"CRITICAL: Failed to initialize database: {e}")
 
 
+@_timed
 async def delete_linked_user(telegram_id: str):
     """Deletes a linked user from the database by their ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             "DELETE FROM linked_users WHERE telegram_id=?", (str(telegram_id),)
         )
         await db.commit()
 
 
+@_timed
 async def store_linked_user(
     telegram_id,
     jellyseerr_user_id,
@@ -97,8 +322,12 @@ async def store_linked_user(
     guild_id=None,
     role_name=None,
 ):
-    """Stores or updates a linked user in the database."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Stores or updates a linked user in the database.
+
+    expires_at (ISO text or datetime) is stored as naive UTC ISO text.
+    """
+    expires_at = _normalize_expires_at(expires_at)
+    async with _connect() as db:
         await db.execute(
             """
             INSERT INTO linked_users (telegram_id, jellyseerr_user_id, jellyfin_user_id, username, expires_at, guild_id, role_name)
@@ -122,11 +351,14 @@ async def store_linked_user(
             ),
         )
         await db.commit()
+    if expires_at is not None:
+        expiry_changed.set()
 
 
+@_timed
 async def get_linked_user(telegram_id: str):
     """Retrieves a linked user's details by their ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         async with db.execute(
             """
             SELECT jellyseerr_user_id, jellyfin_user_id, username, expires_at
@@ -137,27 +369,67 @@ async def get_linked_user(telegram_id: str):
             return await cursor.fetchone()
 
 
-async def get_all_expiring_users():
-    """Retrieves all IDs for users with an expiration date."""
-    async with aiosqlite.connect(DB_PATH) as db:
+@_timed
+async def get_due_expiring_users(now: str):
+    """Retrieves users whose expires_at is at or before `now` (naive UTC ISO).
+
+    expires_at is normalized on write, so the string comparison orders
+    the same way as the dates.
+    """
+    async with _connect() as db:
         async with db.execute(
-            "SELECT telegram_id, jellyseerr_user_id, jellyfin_user_id, expires_at FROM linked_users WHERE expires_at IS NOT NULL"
+            """
+            SELECT telegram_id, jellyseerr_user_id, jellyfin_user_id, expires_at FROM linked_users
+            WHERE expires_at IS NOT NULL AND expires_at != '' AND expires_at <= ?
+            ORDER BY expires_at
+        """,
+            (now,),
         ) as cursor:
             return await cursor.fetchall()
 
 
+@_timed
+async def get_next_expiry(after: str):
+    """Returns the earliest valid expires_at strictly after `after`, or None.
+
+    Malformed or non-normalized values are logged and skipped, so one bad
+    row does not hide the deadlines behind it.
+    """
+    async with _connect() as db:
+        async with db.execute(
+            """
+            SELECT expires_at FROM linked_users
+            WHERE expires_at IS NOT NULL AND expires_at != '' AND expires_at > ?
+            ORDER BY expires_at
+        """,
+            (after,),
+        ) as cursor:
+            async for (expires_at,) in cursor:
+                try:
+                    valid = _normalize_expires_at(expires_at) == expires_at
+                except (TypeError, ValueError):
+                    valid = False
+                if not valid:
+                    logger.error(f"Skipping invalid expires_at: {expires_at!r}")
+                    continue
+                return expires_at
+            return None
+
+
+@_timed
 async def get_all_linked_users():
     """Retrieves all users from the bot's database for /listusers."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         async with db.execute(
             "SELECT telegram_id, username, role_name, expires_at FROM linked_users ORDER BY created_at"
         ) as cursor:
             return await cursor.fetchall()
 
 
+@_timed
 async def get_user_by_username(username: str):
     """Retrieves a user's IDs by their Jellyfin/Jellyseerr username."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         async with db.execute(
             "SELECT telegram_id, jellyseerr_user_id, jellyfin_user_id FROM linked_users WHERE username = ?",
             (username,),
@@ -165,12 +437,25 @@ async def get_user_by_username(username: str):
             return await cursor.fetchone()
 
 
+@_timed
+async def get_telegram_id_by_jellyseerr_user(jellyseerr_user_id: str) -> str | None:
+    """Finds the Telegram account linked to a Jellyseerr user (webhook notifications)."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT telegram_id FROM linked_users WHERE jellyseerr_user_id = ? LIMIT 1",
+            (str(jellyseerr_user_id),),
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+
 # ---------- НОВЫЕ ФУНКЦИИ ----------
 
+@_timed
 async def link_user(telegram_id: str, jellyseerr_user_id: str, username: str = None) -> bool:
     """Привязывает аккаунт Jellyseerr к Telegram ID."""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             await db.execute(
                 """
                 INSERT OR REPLACE INTO linked_users 
@@ -186,10 +471,10 @@ async def link_user(telegram_id: str, jellyseerr_user_id: str, username: str = N
         return False
 
 
+@_timed
 async def check_trial(telegram_id: str) -> dict:
     """Проверяет наличие пробного периода у пользователя."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _connect() as db:
         async with db.execute(
             """
             SELECT * FROM trial_users 
@@ -198,6 +483,7 @@ async def check_trial(telegram_id: str) -> dict:
             """,
             (str(telegram_id),)
         ) as cursor:
+            cursor.row_factory = aiosqlite.Row
             row = await cursor.fetchone()
             if row:
                 return {
@@ -206,14 +492,15 @@ async def check_trial(telegram_id: str) -> dict:
             return None
 
 
+@_timed
 async def check_vip(telegram_id: str) -> dict:
     """Проверяет VIP статус пользователя."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _connect() as db:
         async with db.execute(
             "SELECT * FROM vip_users WHERE telegram_id = ? AND vip_until > datetime('now')",
             (str(telegram_id),)
         ) as cursor:
+            cursor.row_factory = aiosqlite.Row
             row = await cursor.fetchone()
             if row:
                 return {
@@ -222,6 +509,7 @@ async def check_vip(telegram_id: str) -> dict:
             return None
 
 
+@_timed
 async def create_invite_code(telegram_id: str) -> str:
     """Создает инвайт-код для пользователя."""
     # Генерируем случайный код (8 символов)
@@ -229,7 +517,7 @@ async def create_invite_code(telegram_id: str) -> str:
     code = ''.join(secrets.choice(alphabet) for _ in range(8))
     
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             await db.execute(
                 """
                 INSERT INTO invite_codes (code, created_by, expires_at)
@@ -244,10 +532,11 @@ async def create_invite_code(telegram_id: str) -> str:
         return None
 
 
+@_timed
 async def delete_user(telegram_id: str) -> bool:
     """Удаляет пользователя из всех таблиц."""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             # Удаляем из всех таблиц
             await db.execute("DELETE FROM linked_users WHERE telegram_id = ?", (str(telegram_id),))
             await db.execute("DELETE FROM vip_users WHERE telegram_id = ?", (str(telegram_id),))
@@ -259,9 +548,10 @@ async def delete_user(telegram_id: str) -> bool:
         return False
 
 
+@_timed
 async def use_invite_code(code: str, telegram_id: str) -> bool:
     """Использует инвайт-код для регистрации."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         # Проверяем существование и срок действия кода
         async with db.execute(
             """
@@ -283,10 +573,11 @@ async def use_invite_code(code: str, telegram_id: str) -> bool:
         return True
 
 
+@_timed
 async def activate_trial(telegram_id: str, days: int = 7) -> bool:
     """Активирует пробный период для пользователя."""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             await db.execute(
                 """
                 INSERT OR REPLACE INTO trial_users (telegram_id, trial_start, trial_days)
@@ -301,11 +592,12 @@ async def activate_trial(telegram_id: str, days: int = 7) -> bool:
         return False
 
 
+@_timed
 async def set_vip(telegram_id: str, days: int = 30) -> bool:
     """Устанавливает VIP статус пользователю."""
     try:
         vip_until = datetime.now() + timedelta(days=days)
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with _connect() as db:
             await db.execute(
                 """
                 INSERT OR REPLACE INTO vip_users (telegram_id, vip_until)
@@ -318,3 +610,287 @@ async def set_vip(telegram_id: str, days: int = 30) -> bool:
     except Exception as e:
         logger.error(f"Ошибка при установке VIP статуса: {e}")
         return False
+
+
+@_timed
+async def get_watch_aggregate(jellyfin_user_id: str):
+    """Returns (item_count, total_runtime_ticks, synced_at) of the local /watch aggregate."""
+    async with _connect() as db:
+        async with db.execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(runtime_ticks), 0),
+                   (SELECT synced_at FROM watch_sync WHERE jellyfin_user_id = ?)
+            FROM watch_items WHERE jellyfin_user_id = ?
+            """,
+            (jellyfin_user_id, jellyfin_user_id),
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+@_timed
+async def store_watch_items(
+    jellyfin_user_id: str, items: list[tuple[str, int]], synced_at: str, replace: bool = False
+):
+    """Upserts (item_id, runtime_ticks) pairs and moves the sync watermark.
+
+    With replace=True the user's previous items are dropped first (full resync).
+    """
+    async with _connect() as db:
+        if replace:
+            await db.execute(
+                "DELETE FROM watch_items WHERE jellyfin_user_id = ?", (jellyfin_user_id,)
+            )
+        await db.executemany(
+            """
+            INSERT INTO watch_items (jellyfin_user_id, item_id, runtime_ticks)
+            VALUES (?, ?, ?)
+            ON CONFLICT(jellyfin_user_id, item_id) DO UPDATE SET runtime_ticks=excluded.runtime_ticks
+            """,
+            [(jellyfin_user_id, item_id, ticks) for item_id, ticks in items],
+        )
+        await db.execute(
+            """
+            INSERT INTO watch_sync (jellyfin_user_id, synced_at) VALUES (?, ?)
+            ON CONFLICT(jellyfin_user_id) DO UPDATE SET synced_at=excluded.synced_at
+            """,
+            (jellyfin_user_id, synced_at),
+        )
+        await db.commit()
+
+
+async def _upsert_directory_users(db, entries):
+    for jellyfin_user_id, jellyseerr_user_id, username in entries:
+        username_lower = username.lower() if username else None
+        if jellyfin_user_id is None:
+            await db.execute(
+                """
+                INSERT INTO user_directory (jellyfin_user_id, jellyseerr_user_id, username, username_lower)
+                VALUES (NULL, ?, ?, ?)
+                ON CONFLICT(jellyseerr_user_id) DO UPDATE SET
+                    username=excluded.username,
+                    username_lower=excluded.username_lower
+                """,
+                (jellyseerr_user_id, username, username_lower),
+            )
+            continue
+        if jellyseerr_user_id is not None:
+            # Запись Jellyseerr могла попасть в справочник раньше, чем её jellyfinUserId
+            await db.execute(
+                "DELETE FROM user_directory WHERE jellyseerr_user_id = ? AND jellyfin_user_id IS NOT ?",
+                (jellyseerr_user_id, jellyfin_user_id),
+            )
+        await db.execute(
+            """
+            INSERT INTO user_directory (jellyfin_user_id, jellyseerr_user_id, username, username_lower)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(jellyfin_user_id) DO UPDATE SET
+                jellyseerr_user_id=COALESCE(excluded.jellyseerr_user_id, user_directory.jellyseerr_user_id),
+                username=COALESCE(excluded.username, user_directory.username),
+                username_lower=COALESCE(excluded.username_lower, user_directory.username_lower)
+            """,
+            (jellyfin_user_id, jellyseerr_user_id, username, username_lower),
+        )
+
+
+@_timed
+async def upsert_directory_users(entries):
+    """Adds or updates (jellyfin_user_id, jellyseerr_user_id, username) entries.
+
+    Either id may be None; a None jellyseerr id or username keeps the stored value.
+    """
+    async with _connect() as db:
+        await _upsert_directory_users(db, entries)
+        await db.commit()
+
+
+@_timed
+async def replace_user_directory(entries):
+    """Replaces the whole directory in one transaction (full sync)."""
+    async with _connect() as db:
+        await db.execute("DELETE FROM user_directory")
+        await _upsert_directory_users(db, entries)
+        await db.commit()
+
+
+@_timed
+async def prune_directory_jellyfin_users(jellyfin_user_ids):
+    """Removes entries whose Jellyfin account is not in `jellyfin_user_ids`."""
+    async with _connect() as db:
+        await db.execute(
+            """
+            DELETE FROM user_directory
+            WHERE jellyfin_user_id IS NOT NULL
+              AND jellyfin_user_id NOT IN (SELECT value FROM json_each(?))
+            """,
+            (json.dumps(list(jellyfin_user_ids)),),
+        )
+        await db.commit()
+
+
+@_timed
+async def remove_directory_user(jellyfin_user_id=None, jellyseerr_user_id=None):
+    """Removes a user from the directory by either id."""
+    async with _connect() as db:
+        await db.execute(
+            "DELETE FROM user_directory WHERE jellyfin_user_id = ? OR jellyseerr_user_id = ?",
+            (jellyfin_user_id, jellyseerr_user_id),
+        )
+        await db.commit()
+
+
+@_timed
+async def find_directory_user_by_username(username: str):
+    """Returns (jellyfin_user_id, jellyseerr_user_id, username) by case-insensitive username."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT jellyfin_user_id, jellyseerr_user_id, username FROM user_directory WHERE username_lower = ?",
+            (username.lower(),),
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+@_timed
+async def find_directory_user_by_jellyfin_id(jellyfin_user_id: str):
+    """Returns (jellyfin_user_id, jellyseerr_user_id, username) by Jellyfin user id."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT jellyfin_user_id, jellyseerr_user_id, username FROM user_directory WHERE jellyfin_user_id = ?",
+            (str(jellyfin_user_id),),
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+@_timed
+async def get_poster_file_id(poster_url: str):
+    """Returns (file_id, file_unique_id) of an already uploaded poster, or None."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT file_id, file_unique_id FROM poster_file_ids WHERE poster_url = ?",
+            (poster_url,),
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+@_timed
+async def store_poster_file_id(poster_url: str, file_id: str, file_unique_id: str):
+    """Remembers the Telegram file_id of a poster URL."""
+    async with _connect() as db:
+        await db.execute(
+            """
+            INSERT INTO poster_file_ids (poster_url, file_id, file_unique_id) VALUES (?, ?, ?)
+            ON CONFLICT(poster_url) DO UPDATE SET
+                file_id=excluded.file_id,
+                file_unique_id=excluded.file_unique_id
+            """,
+            (poster_url, file_id, file_unique_id),
+        )
+        await db.commit()
+
+
+@_timed
+async def delete_poster_file_id(poster_url: str):
+    """Forgets a poster's file_id, e.g. after Telegram rejected it."""
+    async with _connect() as db:
+        await db.execute("DELETE FROM poster_file_ids WHERE poster_url = ?", (poster_url,))
+        await db.commit()
+
+
+@_timed
+async def get_user_state(user_id: int, now: float):
+    """Returns (state, data_json) of a user's unexpired conversation state, or None."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT state, data FROM user_states WHERE user_id = ? AND expires_at > ?",
+            (user_id, now),
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+@_timed
+async def store_user_state(user_id: int, state: str, data: str | None, expires_at: float):
+    async with _connect() as db:
+        await db.execute(
+            """
+            INSERT INTO user_states (user_id, state, data, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                state=excluded.state, data=excluded.data, expires_at=excluded.expires_at
+            """,
+            (user_id, state, data, expires_at),
+        )
+        await db.commit()
+
+
+@_timed
+async def delete_user_state(user_id: int):
+    async with _connect() as db:
+        await db.execute("DELETE FROM user_states WHERE user_id = ?", (user_id,))
+        await db.commit()
+
+
+@_timed
+async def delete_expired_user_states(now: float) -> int:
+    """Deletes expired states and returns how many remain."""
+    async with _connect() as db:
+        await db.execute("DELETE FROM user_states WHERE expires_at <= ?", (now,))
+        await db.commit()
+        async with db.execute("SELECT COUNT(*) FROM user_states") as cursor:
+            return (await cursor.fetchone())[0]
+
+
+@_timed
+async def count_linked_users() -> int:
+    async with _connect() as db:
+        async with db.execute("SELECT COUNT(*) FROM linked_users") as cursor:
+            return (await cursor.fetchone())[0]
+
+
+@_timed
+async def get_broadcast_recipients(after: str, limit: int) -> list[str]:
+    """Next `limit` telegram_ids after `after`, in primary key order (keyset paging)."""
+    async with _connect() as db:
+        async with db.execute(
+            "SELECT telegram_id FROM linked_users WHERE telegram_id > ? ORDER BY telegram_id LIMIT ?",
+            (after, limit),
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+
+@_timed
+async def create_broadcast(chat_id: int, status_message_id: int, text: str, total: int) -> int:
+    async with _connect() as db:
+        cursor = await db.execute(
+            "INSERT INTO broadcasts (chat_id, status_message_id, text, total) VALUES (?, ?, ?, ?)",
+            (chat_id, status_message_id, text, total),
+        )
+        await db.commit()
+        return cursor.lastrowid
+
+
+@_timed
+async def save_broadcast_progress(broadcast_id: int, last_telegram_id: str, sent: int, failed: int):
+    async with _connect() as db:
+        await db.execute(
+            "UPDATE broadcasts SET last_telegram_id = ?, sent = ?, failed = ? WHERE id = ?",
+            (last_telegram_id, sent, failed, broadcast_id),
+        )
+        await db.commit()
+
+
+@_timed
+async def finish_broadcast(broadcast_id: int, status: str):
+    async with _connect() as db:
+        await db.execute("UPDATE broadcasts SET status = ? WHERE id = ?", (status, broadcast_id))
+        await db.commit()
+
+
+@_timed
+async def get_running_broadcasts():
+    """Broadcasts interrupted by a restart, oldest first."""
+    async with _connect() as db:
+        async with db.execute(
+            """
+            SELECT id, chat_id, status_message_id, text, total, last_telegram_id, sent, failed
+            FROM broadcasts WHERE status = 'running' ORDER BY id
+            """
+        ) as cursor:
+            return await cursor.fetchall()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+
+from config import settings
+from bot.services.background import PeriodicTask
+from bot.services.cache import TTLCache
+from bot.services.result_sessions import PageLoader
+from bot.services.http_clients import jellyseerr_client, jellyseerr_headers
+from bot.services.resilience import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Пачка вебхуков (например, сканирование библиотеки) даёт одно обновление, а не по одному на событие
+INVALIDATE_DEBOUNCE = 10.0
+
+
+class DiscoverFeed:
+    """The shared /discover list, refreshed in the background.
+
+    The feed is identical for every user, so handlers read the in-memory
+    snapshot of the first page and never wait on Jellyseerr once the first
+    refresh is done. Deeper pages are fetched on demand and shared through
+    a cache keyed by the snapshot's generation, so a session made with
+    loader() keeps paging the snapshot it started on after a refresh: its
+    first page is pinned, and deeper pages as long as they stay cached
+    (evicted ones are fetched again from the live feed).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.items: list[dict] = []
+        # totalResults фильмов и сериалов вместе и число страниц длинного из двух списков
+        self.total = 0
+        self.pages = 0
+        # Растёт с каждым обновлением снимка; ключ кэша страниц — (generation, page)
+        self.generation = 0
+        self._pages = TTLCache("discover_pages", 64, max(interval, settings.RESULT_SESSION_TTL))
+        self.updated_at: float | None = None
+        self.last_error: Exception | None = None
+        self._loop = PeriodicTask("Discover refresh", self.refresh, interval)
+        self._refresh_task: asyncio.Task | None = None
+        self._pending_refresh: asyncio.Task | None = None
+
+    async def _fetch(self, page: int = 1) -> tuple[list[dict], int, int]:
+        """One page of the feed: that page of movies, then that page of series.
+
+        Pages get shorter once one list runs out; the feed goes on until the
+        longer one does.
+        """
+        base = f"{settings.JELLYSEERR_URL}/api/v1/discover"
+        params = {"page": page}
+        movies, tv = await asyncio.gather(
+            jellyseerr_client.get(f"{base}/movies", params=params, headers=jellyseerr_headers),
+            jellyseerr_client.get(f"{base}/tv", params=params, headers=jellyseerr_headers),
+        )
+        movies.raise_for_status()
+        tv.raise_for_status()
+        movies, tv = movies.json(), tv.json()
+        items = movies.get("results", []) + tv.get("results", [])
+        total = movies.get("totalResults", 0) + tv.get("totalResults", 0)
+        return items, total, max(movies.get("totalPages", 1), tv.get("totalPages", 1))
+
+    async def _refresh(self):
+        try:
+            self.items, self.total, self.pages = await self._fetch()
+            self.generation += 1
+            self.updated_at = time.monotonic()
+            self.last_error = None
+            logger.info(f"Discover feed refreshed: {len(self.items)} items.")
+        except Exception as e:
+            # Оставляем предыдущий снимок — он лучше, чем пустой ответ
+            self.last_error = e
+            logger.error(f"Error refreshing discover feed: {e}")
+
+    async def refresh(self):
+        """Refreshes the snapshot; concurrent callers share one refresh."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        await asyncio.shield(self._refresh_task)
+
+    def invalidate(self):
+        """Refreshes the snapshot soon; calls within INVALIDATE_DEBOUNCE seconds share one refresh."""
+        if self._pending_refresh is None or self._pending_refresh.done():
+            self._pending_refresh = asyncio.create_task(self._refresh_later())
+
+    async def _refresh_later(self):
+        await asyncio.sleep(INVALIDATE_DEBOUNCE)
+        await self.refresh()
+
+    async def get(self) -> list[dict]:
+        """Returns the snapshot; raises UpstreamUnavailable if there is none and Jellyseerr is down."""
+        if not self.items:
+            await self.refresh()
+            if not self.items and isinstance(self.last_error, UpstreamUnavailable):
+                raise self.last_error
+        return self.items
+
+    async def loader(self) -> PageLoader:
+        """A page loader pinned to the current snapshot, for a result session."""
+        await self.get()
+        first = (self.items, self.total, self.pages)
+        generation = self.generation
+
+        async def load(page: int) -> tuple[list[dict], int, int]:
+            if page == 1:
+                return first
+            return await self._pages.get_or_load((generation, page), lambda: self._fetch(page))
+
+        return load
+
+    def start(self):
+        self._loop.start()
+
+    async def stop(self):
+        if self._pending_refresh is not None:
+            self._pending_refresh.cancel()
+        await self._loop.stop()
+
+
+discover_feed = DiscoverFeed(settings.DISCOVER_REFRESH_INTERVAL)
@@ -0,0 +1,215 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from enum import IntEnum
+
+from pyrogram import ContinuePropagation, StopPropagation
+from pyrogram.types import CallbackQuery
+
+from config import settings
+from bot.services.metrics import CallbackMetric, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(IntEnum):
+    """Priority classes, highest first."""
+
+    INTERACTIVE = 0  # нажатия кнопок и команды админов
+    DEFAULT = 1
+    HEAVY = 2  # /watch, поиск — долгие походы в Jellyfin/Jellyseerr
+
+
+dispatch_wait = Histogram(
+    "tellyseerr_dispatch_wait_seconds",
+    "Time an update waited for a worker, including behind the same user's earlier updates.",
+    ("lane",),
+)
+
+
+class _Job:
+    __slots__ = ("key", "lane", "callback", "args", "future", "queued_at")
+
+    def __init__(self, key, lane: Lane, callback, args: tuple, future: asyncio.Future):
+        self.key = key
+        self.lane = lane
+        self.callback = callback
+        self.args = args
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class UpdateDispatcher:
+    """Runs handler callbacks on its own worker pool, ordered per user.
+
+    Updates from one user run strictly one after another in arrival order,
+    so two quick messages cannot race on that user's state; different users
+    run in parallel on `workers` tasks. A user's next update waits in that
+    user's backlog and only enters its lane once the previous one is done.
+    Free workers take from the highest-priority lane first, and at most
+    `heavy_workers` of them run HEAVY jobs, so a burst of /watch calls
+    always leaves room for button presses and admin commands.
+    """
+
+    def __init__(self, workers: int, heavy_workers: int):
+        self.workers = max(1, workers)
+        self.heavy_workers = max(1, min(heavy_workers, self.workers))
+        self._lanes: dict[Lane, deque[_Job]] = {lane: deque() for lane in Lane}
+        # user -> его следующие апдейты; ключ есть, пока у пользователя что-то выполняется
+        self._backlogs: dict[object, deque[_Job]] = {}
+        self.running: dict[Lane, int] = {lane: 0 for lane in Lane}
+        self._cond = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+
+    async def submit(self, key, lane: Lane, callback, args: tuple) -> asyncio.Future:
+        """Queues `callback(*args)`; the returned future resolves once it has run.
+
+        `key` identifies the user; None means the update is not ordered
+        against anything else.
+        """
+        job = _Job(object() if key is None else key, lane, callback, args,
+                   asyncio.get_running_loop().create_future())
+        async with self._cond:
+            backlog = self._backlogs.get(job.key)
+            if backlog is None:
+                self._backlogs[job.key] = deque()
+                self._lanes[lane].append(job)
+                self._cond.notify()
+            else:
+                backlog.append(job)
+        return job.future
+
+    def _take(self) -> _Job | None:
+        for lane, queue in self._lanes.items():
+            if not queue:
+                continue
+            if lane is Lane.HEAVY and self.running[lane] >= self.heavy_workers:
+                continue
+            return queue.popleft()
+        return None
+
+    async def _run_job(self, job: _Job):
+        dispatch_wait.observe(time.perf_counter() - job.queued_at, job.lane.name.lower())
+        try:
+            await job.callback(*job.args)
+        except (StopPropagation, ContinuePropagation):
+            job.future.set_result(None)
+        except Exception as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(None)
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                job = self._take()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._take()
+                self.running[job.lane] += 1
+
+            try:
+                await self._run_job(job)
+            finally:
+                async with self._cond:
+                    self.running[job.lane] -= 1
+                    backlog = self._backlogs[job.key]
+                    if backlog:
+                        following = backlog.popleft()
+                        self._lanes[following.lane].append(following)
+                    else:
+                        del self._backlogs[job.key]
+                    # Освободился слот HEAVY — будим всех, иначе разбуженный
+                    # воркер может не суметь взять ни одной задачи
+                    self._cond.notify_all()
+
+    def queue_depth(self) -> dict[Lane, int]:
+        """Jobs waiting per lane, including those held back behind the same user."""
+        depth = {lane: len(queue) for lane, queue in self._lanes.items()}
+        for backlog in self._backlogs.values():
+            for job in backlog:
+                depth[job.lane] += 1
+        return depth
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+update_dispatcher = UpdateDispatcher(settings.UPDATE_WORKERS, settings.UPDATE_HEAVY_WORKERS)
+
+CallbackMetric(
+    "tellyseerr_dispatch_queue_depth",
+    "Updates waiting for a worker.",
+    ("lane",),
+    lambda: [((lane.name.lower(),), n) for lane, n in update_dispatcher.queue_depth().items()],
+)
+CallbackMetric(
+    "tellyseerr_dispatch_running",
+    "Updates being handled right now.",
+    ("lane",),
+    lambda: [((lane.name.lower(),), n) for lane, n in update_dispatcher.running.items()],
+)
+
+
+def heavy(callback):
+    """Marks a handler as HEAVY so it cannot take over the worker pool."""
+    callback.lane = Lane.HEAVY
+    return callback
+
+
+def _user_key(update):
+    user = getattr(update, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "chat", None)
+    return chat.id if chat is not None else None
+
+
+def _default_lane(update) -> Lane:
+    if isinstance(update, CallbackQuery):
+        return Lane.INTERACTIVE
+    user = getattr(update, "from_user", None)
+    if user is not None and user.id in settings.ADMIN_USER_IDS:
+        return Lane.INTERACTIVE
+    return Lane.DEFAULT
+
+
+def _log_failure(name: str, future: asyncio.Future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Unhandled error in handler {name}: {error!r}", exc_info=error)
+
+
+def dispatch_handler(callback):
+    """Middleware that hands the callback over to update_dispatcher.
+
+    Pyrogram's own workers then only run the filters and return at once.
+    The lane comes from @heavy, otherwise from the update: callback
+    queries and admins go INTERACTIVE. Returns the job's future.
+    """
+    name = callback.__name__
+    lane = getattr(callback, "lane", None)
+
+    @functools.wraps(callback)
+    async def wrapper(client, update, *args):
+        future = await update_dispatcher.submit(
+            _user_key(update),
+            _default_lane(update) if lane is None else lane,
+            callback,
+            (client, update, *args),
+        )
+        future.add_done_callback(functools.partial(_log_failure, name))
+        return future
+
+    return wrapper
@@ -1,7 +1,16 @@
+import asyncio
+import importlib.util
+import logging
+import re
+import time
+
 import httpx
 from config import settings
+from bot.services.metrics import CallbackMetric, upstream_latency
+from bot.services.profiling import record_upstream
+from bot.services.resilience import CircuitBreaker, ResilientTransport
 
-http_client = httpx.AsyncClient(timeout=15.0)
+logger = logging.getLogger(__name__)
 
 jellyseerr_headers = {
     "X-Api-Key": settings.JELLYSEERR_API_KEY,
@@ -15,5 +24,175 @@ jellyfin_headers = {
     "Accept": "application/json",
 }
 
+# Таймауты по классам запросов: connect у всех короткий, read — по ситуации
+# FAST: search and details, which a user is waiting on
+FAST_TIMEOUT = httpx.Timeout(
+    settings.HTTP_FAST_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+)
+# DEFAULT: single-object reads and writes
+DEFAULT_TIMEOUT = httpx.Timeout(
+    settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+)
+# BULK: paged user lists and watch history sync
+BULK_TIMEOUT = httpx.Timeout(
+    settings.HTTP_BULK_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+)
+
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36})$")
+
+
+def endpoint_label(request: httpx.Request) -> str:
+    """'GET /api/v1/movie/{id}' — the path with numeric and GUID segments folded."""
+    path = "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in request.url.path.split("/")
+    )
+    return f"{request.method} {path}"
+
+
+class UpstreamStats:
+    """Latency and error counters for one upstream endpoint."""
+
+    __slots__ = ("requests", "errors", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, error: bool):
+        self.requests += 1
+        self.errors += error
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+# (upstream, endpoint) -> UpstreamStats
+upstream_stats: dict[tuple[str, str], UpstreamStats] = {}
+
+# upstream -> CircuitBreaker
+breakers: dict[str, CircuitBreaker] = {}
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Times every request of one upstream until its response headers arrive.
+
+    Transport errors and 5xx responses count as errors.
+    """
+
+    def __init__(self, upstream: str, transport: httpx.AsyncBaseTransport):
+        self.upstream = upstream
+        self._transport = transport
+
+    def _record(self, request: httpx.Request, started: float, error: bool):
+        elapsed = time.perf_counter() - started
+        key = (self.upstream, endpoint_label(request))
+        stats = upstream_stats.get(key)
+        if stats is None:
+            stats = upstream_stats[key] = UpstreamStats()
+        stats.record(elapsed, error)
+        upstream_latency.observe(elapsed, *key)
+        record_upstream(elapsed)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            self._record(request, started, True)
+            raise
+        self._record(request, started, response.status_code >= 500)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+CallbackMetric(
+    "tellyseerr_upstream_requests_total",
+    "Upstream requests by endpoint.",
+    ("upstream", "endpoint"),
+    lambda: ((key, stats.requests) for key, stats in upstream_stats.items()),
+    type="counter",
+)
+CallbackMetric(
+    "tellyseerr_upstream_errors_total",
+    "Upstream transport errors and 5xx responses by endpoint.",
+    ("upstream", "endpoint"),
+    lambda: ((key, stats.errors) for key, stats in upstream_stats.items()),
+    type="counter",
+)
+CallbackMetric(
+    "tellyseerr_upstream_circuit_open",
+    "1 while the upstream's circuit breaker rejects requests.",
+    ("upstream",),
+    lambda: (((name,), int(not breaker.available)) for name, breaker in breakers.items()),
+)
+
+
+def _http2_enabled() -> bool:
+    if not settings.HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2=true, but the 'h2' package is not installed. Using HTTP/1.1.")
+        return False
+    return True
+
+
+def _build_client(upstream: str, max_connections: int, max_keepalive: int) -> httpx.AsyncClient:
+    transport = httpx.AsyncHTTPTransport(
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+    breakers[upstream] = CircuitBreaker(
+        upstream, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT
+    )
+    return httpx.AsyncClient(
+        transport=ResilientTransport(
+            InstrumentedTransport(upstream, transport),
+            breakers[upstream],
+            settings.HTTP_RETRIES,
+            settings.HTTP_RETRY_BACKOFF,
+        ),
+        timeout=DEFAULT_TIMEOUT,
+    )
+
+
+# Отдельные пулы соединений: медленный Jellyfin не занимает соединения поиска в Jellyseerr
+jellyseerr_client = _build_client(
+    "jellyseerr", settings.JELLYSEERR_MAX_CONNECTIONS, settings.JELLYSEERR_MAX_KEEPALIVE
+)
+jellyfin_client = _build_client(
+    "jellyfin", settings.JELLYFIN_MAX_CONNECTIONS, settings.JELLYFIN_MAX_KEEPALIVE
+)
+
+
+async def warm_up_http_clients():
+    """Opens HTTP_WARMUP_CONNECTIONS keep-alive connections to each upstream."""
+    targets = [
+        (jellyseerr_client, f"{settings.JELLYSEERR_URL}/api/v1/status", jellyseerr_headers),
+        (jellyfin_client, f"{settings.JELLYFIN_URL}/System/Info/Public", jellyfin_headers),
+    ]
+    results = await asyncio.gather(
+        *(
+            client.get(url, headers=headers, timeout=FAST_TIMEOUT)
+            for client, url, headers in targets
+            for _ in range(settings.HTTP_WARMUP_CONNECTIONS)
+        ),
+        return_exceptions=True,
+    )
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        logger.warning(f"HTTP warm-up: {len(failed)} of {len(results)} requests failed: {failed[0]}")
+    else:
+        logger.info(f"HTTP warm-up: {len(results)} connections opened.")
+
+
 async def close_http_client():
-    await http_client.aclose()
+    await jellyseerr_client.aclose()
+    await jellyfin_client.aclose()
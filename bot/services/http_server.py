@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Соединение без нового запроса дольше этого закрывается (больше keepalive_expiry клиентов)
+IDLE_TIMEOUT = 75.0
+MAX_HEADER_LINES = 100
+
+REASONS = {
+    200: "OK",
+    204: "No Content",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body", "remote")
+
+    def __init__(self, method, path, query, headers, body, remote):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.remote = remote
+
+
+class Response:
+    __slots__ = ("status", "body", "content_type")
+
+    def __init__(self, status: int = 200, body: bytes | str = b"", content_type: str = "text/plain; charset=utf-8"):
+        self.status = status
+        self.body = body.encode() if isinstance(body, str) else body
+        self.content_type = content_type
+
+
+Route = Callable[[Request], Awaitable[Response]]
+
+
+class HTTPServer:
+    """A tiny HTTP/1.1 server on asyncio streams for local endpoints.
+
+    Enough for Prometheus scrapes and webhook deliveries without pulling in
+    a web framework. `routes` maps (method, path) to an async handler;
+    `fallback`, if given, handles every other path. Connections are kept
+    alive until the client asks to close or stays idle for IDLE_TIMEOUT.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        port: int,
+        routes: dict[tuple[str, str], Route],
+        max_body: int = 1024 * 1024,
+        fallback: Route | None = None,
+    ):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.routes = routes
+        self.max_body = max_body
+        self.fallback = fallback
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info(f"{self.name} server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            server, self._server = self._server, None
+            server.close()
+            await server.wait_closed()
+
+    async def _read_request(self, reader: asyncio.StreamReader, remote) -> Request | Response | None:
+        """The next request on the connection, an error Response, or None at EOF."""
+        try:
+            return await self._parse_request(reader, remote)
+        except (asyncio.LimitOverrunError, ValueError):
+            # Строка длиннее лимита StreamReader (64 КиБ): readline бросает ValueError
+            return Response(431, "header line too long")
+
+    async def _parse_request(self, reader: asyncio.StreamReader, remote) -> Request | Response | None:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return None
+        parts = request_line.split()
+        if len(parts) != 3:
+            return Response(400, "bad request line")
+        method, target, version = parts
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            return Response(400, "too many headers")
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return Response(400, "bad content-length")
+        if length > self.max_body:
+            return Response(413, "payload too large")
+        body = await reader.readexactly(length) if length > 0 else b""
+
+        if version == "HTTP/1.0":
+            headers.setdefault("connection", "close")
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body, remote)
+
+    async def _dispatch(self, request: Request) -> Response:
+        route = self.routes.get((request.method, request.path))
+        if route is None:
+            if any(path == request.path for _, path in self.routes):
+                return Response(405, "method not allowed")
+            if self.fallback is None:
+                return Response(404, "not found")
+            route = self.fallback
+        try:
+            return await route(request)
+        except Exception as e:
+            logger.error(f"{self.name} server: {request.method} {request.path} failed: {e}")
+            return Response(500, "internal error")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        remote = writer.get_extra_info("peername")
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, remote), IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    return
+                if request is None:
+                    return
+                if isinstance(request, Response):
+                    response, keep_alive = request, False
+                else:
+                    response = await self._dispatch(request)
+                    keep_alive = request.headers.get("connection", "").lower() != "close"
+
+                head = (
+                    f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'Unknown')}\r\n"
+                    f"Content-Type: {response.content_type}\r\n"
+                    f"Content-Length: {len(response.body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + response.body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
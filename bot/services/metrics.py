@@ -0,0 +1,191 @@
+import functools
+import logging
+import time
+from typing import Callable, Iterable
+
+from config import settings
+from bot.services.http_server import HTTPServer, Request, Response
+
+logger = logging.getLogger(__name__)
+
+# Секунды: от быстрых SQLite-запросов до медленных вызовов Jellyfin
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Everything render() exposes, in registration order
+_registry: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """A Prometheus histogram with fixed buckets, one series per label set."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._series: dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            plain = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{plain} {series[-1]}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+
+class Counter:
+    """A monotonically increasing counter, one series per label set."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class CallbackMetric:
+    """A gauge or counter whose samples are read from live state at scrape time.
+
+    `collect` returns (label values, value) pairs, so modules expose what
+    they already track (cache stats, queue sizes) without double bookkeeping.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...],
+        collect: Callable[[], Iterable[tuple[tuple, float]]],
+        type: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+        self.type = type
+        _registry.append(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        for labels, value in self.collect():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+handler_latency = Histogram(
+    "tellyseerr_handler_duration_seconds",
+    "Time spent in a command or callback handler.",
+    ("handler",),
+)
+handler_errors = Counter(
+    "tellyseerr_handler_errors_total",
+    "Handlers that raised an exception.",
+    ("handler",),
+)
+upstream_latency = Histogram(
+    "tellyseerr_upstream_duration_seconds",
+    "Jellyseerr/Jellyfin request latency until response headers.",
+    ("upstream", "endpoint"),
+)
+db_latency = Histogram(
+    "tellyseerr_db_query_duration_seconds",
+    "Database helper latency, including the wait for a pooled connection.",
+    ("query",),
+)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            logger.error(f"Failed to collect metric {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_handler(callback):
+    """Wraps a Pyrogram handler callback to record its latency and errors."""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(client, *args):
+        started = time.perf_counter()
+        try:
+            return await callback(client, *args)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
+
+async def _metrics_route(_: Request) -> Response:
+    return Response(200, render(), CONTENT_TYPE)
+
+
+metrics_server = HTTPServer(
+    "Metrics",
+    settings.METRICS_HOST,
+    settings.METRICS_PORT,
+    {("GET", "/metrics"): _metrics_route},
+)
+
+
+async def start_metrics_server():
+    """Starts the /metrics endpoint unless METRICS_PORT is 0."""
+    if not settings.METRICS_PORT:
+        return
+    try:
+        await metrics_server.start()
+    except OSError as e:
+        logger.error(f"Could not start metrics server on port {settings.METRICS_PORT}: {e}")
+
+
+async def stop_metrics_server():
+    await metrics_server.stop()
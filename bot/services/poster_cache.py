@@ -0,0 +1,67 @@
+import logging
+from typing import Awaitable, Callable
+
+from pyrogram.errors import BadRequest
+from pyrogram.types import Message
+
+from bot.services.cache import TTLCache
+from bot.services.database import (
+    delete_poster_file_id,
+    get_poster_file_id,
+    store_poster_file_id,
+)
+
+logger = logging.getLogger(__name__)
+
+# Горячие постеры не ходят даже в SQLite; file_id живут долго
+_memory = TTLCache("posters", 4096, 7 * 24 * 60 * 60)
+
+
+async def lookup_poster(poster_url: str) -> tuple[str, str] | None:
+    """Returns (file_id, file_unique_id) of a poster Telegram already has, or None."""
+    if not poster_url:
+        return None
+    cached = _memory.get(poster_url)
+    if cached is None:
+        cached = await get_poster_file_id(poster_url)
+        if cached is not None:
+            _memory.set(poster_url, tuple(cached))
+    return cached
+
+
+async def _remember(poster_url: str, message: Message | None):
+    photo = getattr(message, "photo", None)
+    if not poster_url or photo is None:
+        return
+    cached = _memory.get(poster_url)
+    if cached is not None and cached[1] == photo.file_unique_id:
+        return
+    _memory.set(poster_url, (photo.file_id, photo.file_unique_id))
+    await store_poster_file_id(poster_url, photo.file_id, photo.file_unique_id)
+
+
+async def send_with_poster(
+    poster_url: str, send: Callable[[str], Awaitable[Message]]
+) -> Message:
+    """Calls send(media) with the poster's cached file_id, or its URL on first use.
+
+    The file_id of the sent photo is stored so that later sends reuse the
+    copy on Telegram's servers instead of re-fetching the TMDB image. A
+    file_id Telegram no longer accepts is forgotten and the URL is used.
+    """
+    cached = await lookup_poster(poster_url)
+    if cached is None:
+        message = await send(poster_url)
+    else:
+        try:
+            message = await send(cached[0])
+        except BadRequest as e:
+            logger.warning(f"Cached file_id for {poster_url} rejected: {e}")
+            _memory.invalidate(poster_url)
+            await delete_poster_file_id(poster_url)
+            message = await send(poster_url)
+    try:
+        await _remember(poster_url, message)
+    except Exception as e:
+        logger.error(f"Failed to store poster file_id for {poster_url}: {e}")
+    return message
@@ -0,0 +1,177 @@
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerTiming:
+    """Upstream and DB time awaited by one handler invocation.
+
+    Concurrent calls (asyncio.gather) are summed, so either total can exceed
+    the handler's wall time.
+    """
+
+    __slots__ = ("upstream_seconds", "upstream_calls", "db_seconds", "db_calls")
+
+    def __init__(self):
+        self.upstream_seconds = 0.0
+        self.upstream_calls = 0
+        self.db_seconds = 0.0
+        self.db_calls = 0
+
+
+_current: ContextVar[HandlerTiming | None] = ContextVar("handler_timing", default=None)
+
+# Names of every wrapped handler, to validate /profile arguments
+handler_names: set[str] = set()
+
+
+def record_upstream(seconds: float):
+    timing = _current.get()
+    if timing is not None:
+        timing.upstream_seconds += seconds
+        timing.upstream_calls += 1
+
+
+def record_db(seconds: float):
+    timing = _current.get()
+    if timing is not None:
+        timing.db_seconds += seconds
+        timing.db_calls += 1
+
+
+class _ProfileRequest:
+    __slots__ = ("remaining", "reports", "done")
+
+    def __init__(self, count: int):
+        self.remaining = count
+        self.reports: list[str] = []
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+# handler name -> pending on-demand profile
+_armed: dict[str, _ProfileRequest] = {}
+# cProfile is process-wide: only one invocation is profiled at a time
+_profiling = False
+
+
+def arm_profile(handler_name: str, count: int = 1) -> asyncio.Future:
+    """Profiles the next `count` invocations of a handler with cProfile.
+
+    Returns a future that resolves to the text report (top functions by
+    cumulative time). cProfile is not task-aware: while the handler awaits,
+    the profile also records whatever else the event loop runs. Raises
+    KeyError for an unknown handler name.
+    """
+    if handler_name not in handler_names:
+        raise KeyError(handler_name)
+    request = _armed.get(handler_name)
+    if request is None:
+        request = _armed[handler_name] = _ProfileRequest(max(1, count))
+    return request.done
+
+
+def disarm_profile(handler_name: str):
+    """Cancels a pending on-demand profile."""
+    request = _armed.pop(handler_name, None)
+    if request is not None and not request.done.done():
+        request.done.cancel()
+
+
+def _start_profiler(name: str) -> cProfile.Profile | None:
+    global _profiling
+    if name not in _armed or _profiling:
+        return None
+    _profiling = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _finish_profiler(name: str, profiler: cProfile.Profile, wall: float):
+    global _profiling
+    profiler.disable()
+    _profiling = False
+
+    if settings.PROFILE_DIR:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(
+            settings.PROFILE_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof"
+        )
+        profiler.dump_stats(path)
+        logger.info(f"Saved profile of {name} to {path}")
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(settings.PROFILE_TOP_FUNCTIONS)
+    report = f"{name}: {wall:.3f}s wall\n{out.getvalue()}"
+    logger.info(f"Profile of {name}:\n{report}")
+
+    request = _armed.get(name)
+    if request is None:
+        return
+    request.reports.append(report)
+    request.remaining -= 1
+    if request.remaining <= 0:
+        del _armed[name]
+        if not request.done.done():
+            request.done.set_result("\n".join(request.reports))
+
+
+def _describe(args) -> tuple[str, int | None]:
+    """('/request', user id) for a message, ('media_nav', user id) for a callback."""
+    update = args[0] if args else None
+    user = getattr(update, "from_user", None)
+    user_id = user.id if user else None
+    data = getattr(update, "data", None)
+    if isinstance(data, str):
+        return data.split(":", 1)[0], user_id
+    text = getattr(update, "text", None) or ""
+    if text.startswith("/"):
+        return text.split(maxsplit=1)[0], user_id
+    return "<text>", user_id
+
+
+def profile_handler(callback):
+    """Wraps a Pyrogram handler callback with timing breakdown and on-demand cProfile.
+
+    Invocations slower than SLOW_HANDLER_THRESHOLD seconds are logged with
+    their command, user id, and the upstream and DB time they awaited.
+    """
+    name = callback.__name__
+    handler_names.add(name)
+
+    @functools.wraps(callback)
+    async def wrapper(client, *args):
+        timing = HandlerTiming()
+        token = _current.set(timing)
+        profiler = _start_profiler(name)
+        started = time.perf_counter()
+        try:
+            return await callback(client, *args)
+        finally:
+            wall = time.perf_counter() - started
+            _current.reset(token)
+            if profiler is not None:
+                _finish_profiler(name, profiler, wall)
+            threshold = settings.SLOW_HANDLER_THRESHOLD
+            if threshold and wall >= threshold:
+                command, user_id = _describe(args)
+                logger.warning(
+                    f"Slow handler {name}: {wall:.3f}s "
+                    f"(upstream {timing.upstream_seconds:.3f}s in {timing.upstream_calls} calls, "
+                    f"db {timing.db_seconds:.3f}s in {timing.db_calls} calls) "
+                    f"command={command} user={user_id}"
+                )
+
+    return wrapper
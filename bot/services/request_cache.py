@@ -0,0 +1,55 @@
+import sys
+
+from config import settings
+from bot.services.cache import TTLCache
+from bot.services.result_sessions import ResultSession
+
+
+class RequestRecord:
+    """The part of a Jellyseerr request object that /requests renders."""
+
+    __slots__ = ("media_type", "tmdb_id", "status", "created_at")
+
+    def __init__(self, media_type: str, tmdb_id: int | None, status: int, created_at: str):
+        self.media_type = media_type
+        self.tmdb_id = tmdb_id
+        self.status = status
+        self.created_at = created_at
+
+    @classmethod
+    def from_api(cls, request: dict) -> "RequestRecord":
+        media = request.get("media") or {}
+        return cls(
+            media.get("mediaType", "unknown"),
+            media.get("tmdbId"),
+            request.get("status", 0),
+            request.get("createdAt") or "",
+        )
+
+
+def slim_requests(requests: list[dict]) -> list[RequestRecord]:
+    """Converts raw API results to records, keeping the API's order."""
+    return [RequestRecord.from_api(r) for r in requests]
+
+
+_RECORD_SIZE = (
+    sys.getsizeof(RequestRecord("movie", 0, 0, ""))
+    + sys.getsizeof("movie")
+    + sys.getsizeof("2024-01-01T00:00:00.000Z")
+    + 8  # ссылка в списке страницы
+)
+
+
+def _estimate_size(session: ResultSession) -> int:
+    # Окно страниц растёт уже после set(), поэтому считаем по его пределу
+    return sys.getsizeof(session) + settings.RESULT_WINDOW_PAGES * session.page_size * _RECORD_SIZE
+
+
+# telegram_id -> ResultSession over the user's RequestRecord pages
+request_cache = TTLCache(
+    "requests",
+    settings.REQUEST_CACHE_SIZE,
+    settings.REQUEST_CACHE_TTL,
+    max_weight=settings.REQUEST_CACHE_MAX_BYTES,
+    weigher=_estimate_size,
+)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Повторяем только то, что безопасно отправить дважды
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({502, 503, 504})
+# Запрос не дошёл до сервиса — повтор быстрый и безопасный. Таймаут чтения
+# означает медленный, но живой сервис: повтор лишь умножил бы ожидание
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class UpstreamUnavailable(httpx.TransportError):
+    """Raised without touching the network while an upstream's circuit is open.
+
+    It subclasses httpx.TransportError, so existing `except httpx.RequestError`
+    blocks keep treating it as a network failure.
+    """
+
+    def __init__(self, upstream: str):
+        super().__init__(f"{upstream} is unavailable (circuit open)")
+        self.upstream = upstream
+
+
+class CircuitBreaker:
+    """Per-upstream breaker: closed -> open after N straight failures -> half-open probe."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def available(self) -> bool:
+        return self.state != self.OPEN or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        # Полуоткрытое состояние: пропускаем ровно один пробный запрос
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed.")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Circuit for {self.name} opened after {self.failures} failures."
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Fails fast while the breaker is open and retries idempotent requests.
+
+    Only failures to reach the upstream (connect errors and timeouts, pool
+    timeouts) and 502/503/504 are retried, up to `retries` times with
+    full-jitter exponential backoff; a read timeout fails at once. Each
+    request reports one outcome to the breaker, however many attempts it
+    took.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        breaker: CircuitBreaker,
+        retries: int,
+        backoff: float,
+    ):
+        self._transport = transport
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff = backoff
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            raise UpstreamUnavailable(self.breaker.name)
+        attempts = 1 + (self.retries if request.method in IDEMPOTENT_METHODS else 0)
+        try:
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except RETRY_ERRORS:
+                    if last_attempt:
+                        raise
+                else:
+                    # Обычный 500 — ошибка приложения, а не недоступность сервиса
+                    if response.status_code not in RETRY_STATUSES:
+                        self.breaker.record_success()
+                        return response
+                    if last_attempt:
+                        self.breaker.record_failure()
+                        return response
+                    await response.aclose()
+                await asyncio.sleep(random.uniform(0, self.backoff * 2**attempt))
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Отмена запроса не должна навсегда занять пробный слот
+            self.breaker.release_probe()
+            raise
+
+    async def aclose(self):
+        await self._transport.aclose()
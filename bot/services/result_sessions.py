@@ -0,0 +1,154 @@
+import asyncio
+import bisect
+import logging
+import secrets
+from typing import Awaitable, Callable
+
+from config import settings
+from bot.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# page number (from 1) -> (items on that page, total results, total pages)
+PageLoader = Callable[[int], Awaitable[tuple[list[dict], int, int]]]
+
+
+class ResultSession:
+    """A result list one user is paging through in a single message.
+
+    Only the first page is loaded up front. Further pages come from
+    `load_page` when the user gets there: the next one is fetched in the
+    background once the user is within RESULT_PREFETCH_MARGIN items of the
+    end of the loaded page, and at most RESULT_WINDOW_PAGES pages around
+    the current one are kept (going back to a dropped page loads it again).
+
+    Pages may differ in length (a /discover page is a page of movies plus a
+    page of series, and either list can run out first), so indexes are
+    mapped to pages by the starts of the pages seen so far. The list ends
+    only on the last page the loader reports.
+    """
+
+    __slots__ = (
+        "user_id", "total", "page_size", "page_count",
+        "_load_page", "_pages", "_starts", "_loading", "_current",
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        first_page: list[dict],
+        total: int,
+        load_page: PageLoader | None = None,
+        page_count: int = 1,
+    ):
+        self.user_id = user_id
+        if load_page is None or page_count <= 1:
+            load_page, page_count = None, 1
+            total = len(first_page)
+        self.total = max(total, len(first_page))
+        # Для оценки памяти сессии; страницы бывают и короче, и длиннее
+        self.page_size = max(1, len(first_page))
+        self.page_count = page_count
+        self._load_page = load_page
+        self._pages: dict[int, list[dict]] = {1: first_page}
+        # _starts[n - 1] — индекс первого элемента страницы n
+        self._starts = [0, len(first_page)]
+        self._loading: dict[int, asyncio.Task] = {}
+        self._current = 1
+
+    async def get(self, index: int) -> dict | None:
+        """The item at `index`, loading its page if needed; None past the end."""
+        while 0 <= index < self.total:
+            number = bisect.bisect_right(self._starts, index)
+            if number > self.page_count:
+                break
+            items = await self._page(number)
+            start = self._starts[number - 1]
+            last = number >= self.page_count or not items
+            if number == len(self._starts) and not last:
+                self._starts.append(start + len(items))
+            position = index - start
+            if position < len(items):
+                self._current = number
+                self._trim()
+                if position >= len(items) - settings.RESULT_PREFETCH_MARGIN:
+                    self._prefetch(number + 1)
+                return items[position]
+            if last:
+                # Последняя страница — теперь точно знаем, сколько всего результатов
+                self.total = start + len(items)
+                break
+            if number < len(self._starts) - 1:
+                # Страница после перезагрузки стала короче, чем была
+                break
+        return None
+
+    async def _page(self, number: int) -> list[dict]:
+        items = self._pages.get(number)
+        if items is not None:
+            return items
+        if self._load_page is None:
+            return []
+        task = self._loading.get(number) or self._start(number)
+        return await asyncio.shield(task)
+
+    def _start(self, number: int) -> asyncio.Task:
+        task = asyncio.create_task(self._load(number))
+        self._loading[number] = task
+        return task
+
+    async def _load(self, number: int) -> list[dict]:
+        try:
+            items, _, page_count = await self._load_page(number)
+        finally:
+            self._loading.pop(number, None)
+        self.page_count = max(number, page_count)
+        self._pages[number] = items
+        self._trim()
+        return items
+
+    def _prefetch(self, number: int):
+        if self._load_page is None or number in self._pages or number in self._loading:
+            return
+        if number > self.page_count:
+            return
+        self._start(number).add_done_callback(_log_prefetch_failure)
+
+    def _trim(self):
+        while len(self._pages) > settings.RESULT_WINDOW_PAGES:
+            farthest = max(self._pages, key=lambda n: abs(n - self._current))
+            del self._pages[farthest]
+
+
+def _log_prefetch_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Prefetching the next result page failed: {task.exception()!r}")
+
+
+# Кнопки несут только короткий id сессии и индекс: callback_data не длиннее
+# 64 байт при любой длине запроса, а листание по загруженным страницам
+# не ходит в Jellyseerr
+_sessions = TTLCache("result_sessions", settings.RESULT_SESSION_SIZE, settings.RESULT_SESSION_TTL)
+
+
+def create_session(
+    user_id: int,
+    first_page: list[dict],
+    total: int,
+    load_page: PageLoader | None = None,
+    page_count: int = 1,
+) -> str:
+    """Stores a result list and returns its opaque id (8 URL-safe characters)."""
+    session_id = secrets.token_urlsafe(6)
+    while session_id in _sessions:
+        session_id = secrets.token_urlsafe(6)
+    _sessions.set(session_id, ResultSession(user_id, first_page, total, load_page, page_count))
+    return session_id
+
+
+def get_session(session_id: str, user_id: int) -> ResultSession | None:
+    """The session, or None if it expired, was evicted or belongs to someone else."""
+    session = _sessions.get(session_id)
+    if session is None or session.user_id != user_id:
+        return None
+    return session
@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait, InternalServerError, ServiceUnavailable
+from pyrogram.raw.functions import messages
+
+from config import settings
+from bot.services.metrics import CallbackMetric, Counter
+
+logger = logging.getLogger(__name__)
+
+# Сбои, после которых запрос имеет смысл повторить
+TRANSIENT_ERRORS = (OSError, TimeoutError, InternalServerError, ServiceUnavailable)
+# Client.invoke бросает ConnectionError до отправки, если клиент не подключён.
+# После таймаута или 5xx сообщение могло уже уйти — отправку не повторяем
+UNSENT_ERRORS = (ConnectionError,)
+
+# Создают сообщения: повтор после неясного сбоя дал бы дубль
+SEND_FUNCTIONS = (
+    messages.SendMessage,
+    messages.SendMedia,
+    messages.SendMultiMedia,
+    messages.ForwardMessages,
+    messages.SendInlineBotResult,
+)
+# Только эти вызовы подпадают под лимиты Telegram на сообщения в чат
+PACED_FUNCTIONS = SEND_FUNCTIONS + (messages.EditMessage,)
+# Корзины чатов, которые давно не писали, выбрасываются после стольких чатов
+MAX_IDLE_CHAT_BUCKETS = 10_000
+
+
+class SendPriority(IntEnum):
+    INTERACTIVE = 0  # ответы на команды и кнопки
+    BULK = 1  # уведомления об истечении доступа, вебхуки, рассылки
+
+
+_priority: ContextVar[SendPriority] = ContextVar("send_priority", default=SendPriority.INTERACTIVE)
+
+
+@contextmanager
+def bulk_sends():
+    """Sends made inside the block wait behind interactive replies."""
+    token = _priority.set(SendPriority.BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Takes a token, possibly one not yet there; returns the wait for it."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float):
+        """No token for `seconds` (after a FloodWait)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendScheduler:
+    """Paces every chat-bound Telegram call of a client.
+
+    Installed over Client.invoke, so replies, edits and bound methods of
+    messages all pass through it. Sends, forwards and edits take a token
+    from their chat's bucket and then from the global one; interactive
+    calls get global tokens before BULK ones. A FloodWait blocks the chat's
+    bucket (and BULK sends as a whole) for the requested time and the call
+    is retried up to SEND_RETRIES times. Edits are also retried after
+    transient network and 5xx errors; sends only when the request never
+    left, so a message Telegram already accepted is not sent twice. Other
+    calls (reads, callback answers, deletes) go straight through.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[object, TokenBucket] = {}
+        self._waiters: list[tuple[SendPriority, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._bulk_paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def install(self, client: Client):
+        invoke = client.invoke
+
+        async def scheduled_invoke(query, *args, **kwargs):
+            return await self.call(invoke, query, *args, **kwargs)
+
+        client.invoke = scheduled_invoke
+
+    def _chat(self, key) -> TokenBucket:
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_CHAT_BUCKETS:
+                now = time.monotonic()
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _global_turn(self, priority: SendPriority):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            now = time.monotonic()
+            delay = self._global.wait_time(now)
+            if priority is SendPriority.BULK:
+                delay = max(delay, self._bulk_paused_until - now)
+            if delay > 0:
+                # Новый интерактивный запрос может прийти раньше — ждём его тоже
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._waiters)
+            self._global.take()
+            future.set_result(None)
+
+    async def _acquire(self, chat, priority: SendPriority):
+        delay = self._chat(chat).reserve(time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._global_turn(priority)
+
+    async def call(self, invoke, query, *args, **kwargs):
+        peer = getattr(query, "peer", None)
+        if peer is None or not isinstance(query, PACED_FUNCTIONS):
+            return await invoke(query, *args, **kwargs)
+
+        chat = _peer_key(peer)
+        priority = _priority.get()
+        retry_errors = UNSENT_ERRORS if isinstance(query, SEND_FUNCTIONS) else TRANSIENT_ERRORS
+        # FloodWait любой длины отдаём сюда, а не спим внутри Pyrogram
+        kwargs.setdefault("sleep_threshold", 0)
+        attempt = 0
+        while True:
+            await self._acquire(chat, priority)
+            try:
+                return await invoke(query, *args, **kwargs)
+            except FloodWait as e:
+                wait = float(e.value or 0)
+                now = time.monotonic()
+                self._chat(chat).block(now, wait)
+                if priority is SendPriority.BULK:
+                    self._bulk_paused_until = max(self._bulk_paused_until, now + wait)
+                flood_waits.inc(priority.name.lower())
+                attempt += 1
+                if wait > settings.SEND_MAX_FLOOD_WAIT or attempt > settings.SEND_RETRIES:
+                    raise
+                logger.warning(f"FloodWait {wait:.0f}s for chat {chat[1]}, retrying")
+            except retry_errors as e:
+                attempt += 1
+                if attempt > settings.SEND_RETRIES:
+                    raise
+                send_retries.inc(priority.name.lower())
+                logger.warning(f"Retrying send to chat {chat[1]} after {e!r}")
+                await asyncio.sleep(2 ** (attempt - 1))
+
+    def queue_depth(self) -> dict[SendPriority, int]:
+        depth = {priority: 0 for priority in SendPriority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[priority] += 1
+        return depth
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _peer_key(peer) -> tuple[str, int]:
+    for attribute in ("user_id", "chat_id", "channel_id"):
+        value = getattr(peer, attribute, None)
+        if value is not None:
+            return attribute, value
+    return type(peer).__name__, 0
+
+
+send_scheduler = SendScheduler(
+    settings.SEND_GLOBAL_RATE, settings.SEND_CHAT_RATE, settings.SEND_CHAT_BURST
+)
+
+flood_waits = Counter(
+    "tellyseerr_send_flood_waits_total",
+    "FloodWait errors returned by Telegram, by send priority.",
+    ("priority",),
+)
+send_retries = Counter(
+    "tellyseerr_send_retries_total",
+    "Telegram calls retried after a transient error, by send priority.",
+    ("priority",),
+)
+CallbackMetric(
+    "tellyseerr_send_queue_depth",
+    "Telegram calls waiting for a global send token, by priority.",
+    ("priority",),
+    lambda: [((p.name.lower(),), n) for p, n in send_scheduler.queue_depth().items()],
+)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from config import settings
+from bot.services.background import PeriodicTask
+from bot.services.http_clients import (
+    BULK_TIMEOUT,
+    jellyfin_client,
+    jellyfin_headers,
+    jellyseerr_client,
+    jellyseerr_headers,
+)
+from bot.services.database import (
+    find_directory_user_by_jellyfin_id,
+    prune_directory_jellyfin_users,
+    replace_user_directory,
+    upsert_directory_users,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _jellyseerr_entry(user: dict) -> tuple[str | None, str, str | None]:
+    jellyfin_user_id = user.get("jellyfinUserId")
+    username = user.get("jellyfinUsername") or user.get("username") or user.get("displayName")
+    return (
+        str(jellyfin_user_id) if jellyfin_user_id else None,
+        str(user["id"]),
+        username,
+    )
+
+
+class UserDirectorySync:
+    """Keeps the local user_directory table in step with Jellyfin and Jellyseerr.
+
+    A full sync runs at startup; after that a delta sync every interval
+    re-reads the Jellyfin user list (one request, it is not paged) and only
+    the Jellyseerr users updated since the previous sync.
+    """
+
+    def __init__(self, interval: float, page_size: int):
+        self.interval = interval
+        self.page_size = page_size
+        self.synced_at: datetime | None = None
+        self._loop = PeriodicTask("User directory sync", self.refresh, interval)
+        self._sync_task: asyncio.Task | None = None
+
+    async def _fetch_jellyfin_users(self) -> dict[str, str]:
+        response = await jellyfin_client.get(
+            f"{settings.JELLYFIN_URL}/Users", headers=jellyfin_headers, timeout=BULK_TIMEOUT
+        )
+        response.raise_for_status()
+        return {str(u["Id"]): u.get("Name") for u in response.json()}
+
+    async def _fetch_jellyseerr_users(self, since: datetime | None) -> list[dict]:
+        """Pages through Jellyseerr users, newest updates first, stopping at `since`."""
+        users = []
+        skip = 0
+        while True:
+            response = await jellyseerr_client.get(
+                f"{settings.JELLYSEERR_URL}/api/v1/user",
+                headers=jellyseerr_headers,
+                params={"take": self.page_size, "skip": skip, "sort": "updated"},
+                timeout=BULK_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+            page = data.get("results", [])
+            for user in page:
+                updated_at = user.get("updatedAt")
+                if since and updated_at and datetime.fromisoformat(
+                    updated_at.replace("Z", "+00:00")
+                ) < since:
+                    return users
+                users.append(user)
+            skip += len(page)
+            if not page or skip >= data.get("pageInfo", {}).get("results", 0):
+                return users
+
+    async def full_sync(self):
+        started_at = datetime.now(timezone.utc)
+        jellyfin_users, jellyseerr_users = await asyncio.gather(
+            self._fetch_jellyfin_users(), self._fetch_jellyseerr_users(None)
+        )
+        entries = {jf_id: (jf_id, None, name) for jf_id, name in jellyfin_users.items()}
+        local_only = []
+        for user in jellyseerr_users:
+            jf_id, seerr_id, name = _jellyseerr_entry(user)
+            if jf_id in entries:
+                entries[jf_id] = (jf_id, seerr_id, entries[jf_id][2] or name)
+            else:
+                local_only.append((None, seerr_id, name))
+        await replace_user_directory(list(entries.values()) + local_only)
+        self.synced_at = started_at
+        logger.info(
+            f"User directory full sync: {len(jellyfin_users)} Jellyfin, "
+            f"{len(jellyseerr_users)} Jellyseerr users."
+        )
+
+    async def delta_sync(self):
+        if self.synced_at is None:
+            await self.full_sync()
+            return
+        started_at = datetime.now(timezone.utc)
+        jellyfin_users, jellyseerr_users = await asyncio.gather(
+            self._fetch_jellyfin_users(), self._fetch_jellyseerr_users(self.synced_at)
+        )
+        await upsert_directory_users(
+            [(jf_id, None, name) for jf_id, name in jellyfin_users.items()]
+            + [_jellyseerr_entry(user) for user in jellyseerr_users]
+        )
+        await prune_directory_jellyfin_users(jellyfin_users.keys())
+        self.synced_at = started_at
+        logger.info(f"User directory delta sync: {len(jellyseerr_users)} Jellyseerr updates.")
+
+    async def refresh(self):
+        """Runs a delta sync; concurrent callers share one run."""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self.delta_sync())
+        await asyncio.shield(self._sync_task)
+
+    def start(self):
+        self._loop.start()
+
+    async def stop(self):
+        await self._loop.stop()
+
+
+user_directory = UserDirectorySync(
+    settings.USER_DIRECTORY_SYNC_INTERVAL, settings.USER_DIRECTORY_PAGE_SIZE
+)
+
+
+async def find_jellyseerr_user_id(jellyfin_user_id: str) -> str | None:
+    """Looks up the Jellyseerr id of a Jellyfin user locally, syncing once on a miss."""
+    entry = await find_directory_user_by_jellyfin_id(jellyfin_user_id)
+    if entry is None or entry[1] is None:
+        try:
+            await user_directory.refresh()
+        except Exception as e:
+            logger.error(f"User directory refresh failed: {e}")
+            return None
+        entry = await find_directory_user_by_jellyfin_id(jellyfin_user_id)
+    return entry[1] if entry else None
@@ -1,7 +1,17 @@
-
 # bot/services/user_state.py
+import json
+import logging
+import time
 from enum import Enum, auto
 
+from config import settings
+from bot.services import database
+from bot.services.background import PeriodicTask
+from bot.services.metrics import CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+
 class UserState(Enum):
     NONE = auto()
     REQUEST_SEARCH = auto()
@@ -10,24 +20,102 @@ class UserState(Enum):
     ADMIN_TRIAL = auto()       # ← Новый
     ADMIN_VIP = auto()         # ← Новый
 
+
+class _Entry:
+    __slots__ = ("state", "data", "expires_at")
+
+    def __init__(self, state: UserState, data, expires_at: float):
+        self.state = state
+        self.data = data
+        self.expires_at = expires_at
+
+
 class UserStateManager:
-    def __init__(self):
-        self.states = {}
-        self.pending_data = {}  # Для хранения reply_to_message
+    """Per-user conversation state (/request, /link, admin flows) with a TTL.
+
+    A flow the user abandons expires after `ttl` seconds, and a background
+    sweep drops expired entries. With `persistent`, entries live in the
+    SQLite user_states table instead of memory: in-flight flows survive a
+    restart and are shared by every bot process using the same database.
+    In that mode `data` must be JSON-serializable.
+    """
+
+    def __init__(self, ttl: float, sweep_interval: float, persistent: bool = False):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.persistent = persistent
+        self._entries: dict[int, _Entry] = {}
+        # Сколько записей в таблице на момент последней чистки (для метрик)
+        self._persisted = 0
+        self._sweeper = PeriodicTask("User state sweep", self.sweep, sweep_interval, run_first=False)
+
+    def __len__(self) -> int:
+        return self._persisted if self.persistent else len(self._entries)
+
+    async def set(self, user_id: int, state: UserState, data=None, ttl: float | None = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        if self.persistent:
+            payload = None if data is None else json.dumps(data)
+            await database.store_user_state(user_id, state.name, payload, expires_at)
+        else:
+            self._entries[user_id] = _Entry(state, data, expires_at)
+
+    async def _get_entry(self, user_id: int) -> _Entry | None:
+        now = time.time()
+        if self.persistent:
+            row = await database.get_user_state(user_id, now)
+            if row is None:
+                return None
+            state, payload = row
+            if state not in UserState.__members__:
+                return None
+            return _Entry(UserState[state], None if payload is None else json.loads(payload), 0)
+
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[user_id]
+            return None
+        return entry
+
+    async def get(self, user_id: int) -> UserState:
+        entry = await self._get_entry(user_id)
+        return entry.state if entry is not None else UserState.NONE
+
+    async def get_data(self, user_id: int):
+        entry = await self._get_entry(user_id)
+        return entry.data if entry is not None else None
+
+    async def clear(self, user_id: int):
+        if self.persistent:
+            await database.delete_user_state(user_id)
+        else:
+            self._entries.pop(user_id, None)
+
+    async def sweep(self):
+        now = time.time()
+        if self.persistent:
+            self._persisted = await database.delete_expired_user_states(now)
+            return
+        expired = [uid for uid, entry in self._entries.items() if entry.expires_at <= now]
+        for uid in expired:
+            del self._entries[uid]
+        if expired:
+            logger.info(f"Dropped {len(expired)} expired user states.")
 
-    def set(self, user_id: int, state: UserState, data=None):
-        self.states[user_id] = state
-        if data is not None:
-            self.pending_data[user_id] = data
+    def start(self):
+        self._sweeper.start()
 
-    def get(self, user_id: int) -> UserState:
-        return self.states.get(user_id, UserState.NONE)
+    async def stop(self):
+        await self._sweeper.stop()
 
-    def get_data(self, user_id: int):
-        return self.pending_data.get(user_id)
 
-    def clear(self, user_id: int):
-        self.states.pop(user_id, None)
-        self.pending_data.pop(user_id, None)
+user_states = UserStateManager(
+    settings.USER_STATE_TTL, settings.USER_STATE_SWEEP_INTERVAL, settings.USER_STATE_PERSIST
+)
 
-user_states = UserStateManager()
+CallbackMetric(
+    "tellyseerr_user_states",
+    "Users in the middle of a flow (as of the last sweep when persistent).",
+    (),
+    lambda: [((), len(user_states))],
+)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from config import settings
+from bot.services.http_clients import BULK_TIMEOUT, jellyfin_client, jellyfin_headers
+from bot.services.database import get_watch_aggregate, store_watch_items
+
+logger = logging.getLogger(__name__)
+
+PLAYED_PARAMS = {
+    "Recursive": "true",
+    "IncludeItemTypes": "Movie,Episode",
+    "Filters": "IsPlayed",
+}
+
+# jellyfin_user_id -> running sync, so one user never syncs twice at once
+_syncs: dict[str, asyncio.Task] = {}
+
+
+def _items_url(jellyfin_user_id: str) -> str:
+    return f"{settings.JELLYFIN_URL}/Users/{jellyfin_user_id}/Items"
+
+
+async def fetch_played_summary(jellyfin_user_id: str) -> tuple[int, dict | None]:
+    """Returns (played item count, last played item) without downloading the history.
+
+    The count comes from TotalRecordCount with Limit=0, the last item from
+    SortBy=DatePlayed with Limit=1.
+    """
+    url = _items_url(jellyfin_user_id)
+    count_res, last_res = await asyncio.gather(
+        jellyfin_client.get(
+            url,
+            headers=jellyfin_headers,
+            params={**PLAYED_PARAMS, "Limit": 0, "EnableImages": "false"},
+        ),
+        jellyfin_client.get(
+            url,
+            headers=jellyfin_headers,
+            params={
+                **PLAYED_PARAMS,
+                "SortBy": "DatePlayed",
+                "SortOrder": "Descending",
+                "Limit": 1,
+                "Fields": "SeriesName",
+                "EnableImages": "false",
+            },
+        ),
+    )
+    count_res.raise_for_status()
+    last_res.raise_for_status()
+    items = last_res.json().get("Items", [])
+    return count_res.json().get("TotalRecordCount", 0), (items[0] if items else None)
+
+
+async def _fetch_played_items(jellyfin_user_id: str, since: str | None) -> list[tuple[str, int]]:
+    """Pages through played items, optionally only those whose user data changed since `since`."""
+    params = {
+        **PLAYED_PARAMS,
+        "Limit": settings.WATCH_SYNC_PAGE_SIZE,
+        "EnableImages": "false",
+        "EnableUserData": "false",
+        # Порядок, который не меняется от просмотров: иначе во время синхронизации
+        # элементы сдвигаются между страницами и пропускаются или считаются дважды
+        "SortBy": "SortName,DateCreated",
+        "SortOrder": "Ascending",
+    }
+    if since:
+        params["MinDateLastSavedForUser"] = f"{since}Z"
+
+    items: dict[str, int] = {}
+    start = 0
+    while True:
+        response = await jellyfin_client.get(
+            _items_url(jellyfin_user_id),
+            headers=jellyfin_headers,
+            params={**params, "StartIndex": start},
+            timeout=BULK_TIMEOUT,
+        )
+        response.raise_for_status()
+        page = response.json().get("Items", [])
+        items.update((item["Id"], item.get("RunTimeTicks") or 0) for item in page)
+        start += len(page)
+        if len(page) < settings.WATCH_SYNC_PAGE_SIZE:
+            return list(items.items())
+
+
+async def _sync(jellyfin_user_id: str, server_count: int):
+    _, _, synced_at = await get_watch_aggregate(jellyfin_user_id)
+    # Водяной знак берём до запроса, чтобы не пропустить просмотры во время синхронизации
+    started_at = datetime.utcnow().isoformat()
+
+    if synced_at is not None:
+        items = await _fetch_played_items(jellyfin_user_id, synced_at)
+        await store_watch_items(jellyfin_user_id, items, started_at)
+        local_count, _, _ = await get_watch_aggregate(jellyfin_user_id)
+        if local_count == server_count:
+            logger.info(f"Watch history of {jellyfin_user_id}: +{len(items)} items (delta).")
+            return
+        # Снятые отметки «просмотрено» инкрементально не видны — пересобираем целиком
+        logger.info(
+            f"Watch history of {jellyfin_user_id} drifted ({local_count} != {server_count}), resyncing."
+        )
+
+    items = await _fetch_played_items(jellyfin_user_id, None)
+    await store_watch_items(jellyfin_user_id, items, started_at, replace=True)
+    logger.info(f"Watch history of {jellyfin_user_id}: {len(items)} items (full sync).")
+
+
+def sync_watch_history(jellyfin_user_id: str, server_count: int) -> asyncio.Task:
+    """Starts (or joins) a background sync of the user's local watch aggregate."""
+    task = _syncs.get(jellyfin_user_id)
+    if task is None or task.done():
+        task = asyncio.create_task(_sync(jellyfin_user_id, server_count))
+        _syncs[jellyfin_user_id] = task
+        task.add_done_callback(lambda t: _on_sync_done(jellyfin_user_id, t))
+    return task
+
+
+def _on_sync_done(jellyfin_user_id: str, task: asyncio.Task):
+    if _syncs.get(jellyfin_user_id) is task:
+        del _syncs[jellyfin_user_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Watch history sync failed for {jellyfin_user_id}: {task.exception()}")
@@ -0,0 +1,180 @@
+import hmac
+import html
+import json
+import logging
+
+from pyrogram import Client
+from pyrogram.enums import ParseMode
+
+from config import settings
+from bot.helpers.formatting import invalidate_media_details
+from bot.i18n import t, use_locale, user_locale
+from bot.services.database import get_telegram_id_by_jellyseerr_user
+from bot.services.discover import discover_feed
+from bot.services.http_clients import FAST_TIMEOUT, jellyseerr_client, jellyseerr_headers
+from bot.services.http_server import HTTPServer, Request, Response
+from bot.services.metrics import Counter
+from bot.services.request_cache import request_cache
+from bot.services.send_queue import bulk_sends
+from bot.services.background import spawn_background
+
+logger = logging.getLogger(__name__)
+
+# Jellyseerr notification_type -> сообщение автору запроса
+NOTIFICATIONS = {
+    "MEDIA_APPROVED": "webhook_request_approved",
+    "MEDIA_AUTO_APPROVED": "webhook_request_approved",
+    "MEDIA_AVAILABLE": "webhook_request_available",
+    "MEDIA_DECLINED": "webhook_request_declined",
+    "MEDIA_FAILED": "webhook_request_failed",
+}
+# Jellyfin ItemType -> mediaType Jellyseerr
+JELLYFIN_ITEM_TYPES = {"Movie": "movie", "Series": "tv", "Season": "tv", "Episode": "tv"}
+
+webhook_events = Counter(
+    "tellyseerr_webhook_events_total",
+    "Webhook deliveries accepted, by source and event type.",
+    ("source", "event"),
+)
+
+_client: Client | None = None
+
+
+def _authorized(request: Request) -> bool:
+    supplied = request.headers.get("authorization", "")
+    return hmac.compare_digest(supplied.encode(), settings.WEBHOOK_SECRET.encode())
+
+
+async def _process_safely(process, payload: dict):
+    try:
+        await process(payload)
+    except Exception:
+        logger.exception(f"Failed to process webhook payload: {payload!r}")
+
+
+def _valid_tmdb_id(tmdb_id, payload: dict) -> bool:
+    """Webhook templates are user-editable, so the id may be anything."""
+    if str(tmdb_id).isdigit():
+        return True
+    logger.warning(f"Ignoring webhook media with invalid TMDB id {tmdb_id!r}: {payload!r}")
+    return False
+
+
+def _accept(request: Request, process) -> Response:
+    """Checks the secret, parses the body and processes it after replying."""
+    if not _authorized(request):
+        logger.warning(f"Rejected webhook from {request.remote}: bad Authorization header")
+        return Response(401, "unauthorized")
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return Response(400, "invalid JSON")
+    if not isinstance(payload, dict):
+        return Response(400, "expected a JSON object")
+
+    # Отвечаем сразу: Jellyseerr/Jellyfin не должны ждать Telegram
+    spawn_background(_process_safely(process, payload))
+    return Response(204)
+
+
+async def _requester_telegram_id(request_id) -> str | None:
+    """Telegram id of whoever made a Jellyseerr request, if they linked their account."""
+    response = await jellyseerr_client.get(
+        f"{settings.JELLYSEERR_URL}/api/v1/request/{int(request_id)}",
+        headers=jellyseerr_headers,
+        timeout=FAST_TIMEOUT,
+    )
+    response.raise_for_status()
+    requester = (response.json().get("requestedBy") or {}).get("id")
+    if requester is None:
+        return None
+    return await get_telegram_id_by_jellyseerr_user(requester)
+
+
+async def _notify(telegram_id: str, key: str, title: str):
+    with use_locale(user_locale(int(telegram_id))):
+        text = t(key, title=html.escape(title))
+    try:
+        with bulk_sends():
+            await _client.send_message(int(telegram_id), text, parse_mode=ParseMode.HTML)
+    except Exception as e:
+        logger.error(f"Failed to notify {telegram_id} about a request update: {e}")
+
+
+async def _process_jellyseerr(payload: dict):
+    event = payload.get("notification_type") or "UNKNOWN"
+    webhook_events.inc("jellyseerr", event)
+    if event == "TEST_NOTIFICATION":
+        logger.info("Jellyseerr test webhook received.")
+        return
+
+    media = payload.get("media") or {}
+    if media.get("tmdbId") and media.get("media_type") and _valid_tmdb_id(media["tmdbId"], payload):
+        invalidate_media_details(media["media_type"], media["tmdbId"])
+        # В /discover видна только доступность — одобрения и отказы его не меняют
+        if event == "MEDIA_AVAILABLE":
+            discover_feed.invalidate()
+
+    request_id = (payload.get("request") or {}).get("request_id")
+    if not request_id:
+        return
+    try:
+        telegram_id = await _requester_telegram_id(request_id)
+    except Exception as e:
+        logger.error(f"Could not resolve the requester of request {request_id}: {e}")
+        return
+    if telegram_id is None:
+        return
+
+    request_cache.invalidate(telegram_id)
+    key = NOTIFICATIONS.get(event)
+    if key is not None and _client is not None:
+        await _notify(telegram_id, key, payload.get("subject") or "")
+
+
+async def _process_jellyfin(payload: dict):
+    event = payload.get("NotificationType") or "Unknown"
+    webhook_events.inc("jellyfin", event)
+    media_type = JELLYFIN_ITEM_TYPES.get(payload.get("ItemType"))
+    tmdb_id = payload.get("Provider_tmdb")
+    if event == "ItemAdded" and media_type and tmdb_id and _valid_tmdb_id(tmdb_id, payload):
+        invalidate_media_details(media_type, tmdb_id)
+        discover_feed.invalidate()
+
+
+async def _jellyseerr_route(request: Request) -> Response:
+    return _accept(request, _process_jellyseerr)
+
+
+async def _jellyfin_route(request: Request) -> Response:
+    return _accept(request, _process_jellyfin)
+
+
+webhook_server = HTTPServer(
+    "Webhooks",
+    settings.WEBHOOK_HOST,
+    settings.WEBHOOK_PORT,
+    {
+        ("POST", "/webhook/jellyseerr"): _jellyseerr_route,
+        ("POST", "/webhook/jellyfin"): _jellyfin_route,
+    },
+)
+
+
+async def start_webhook_server(client: Client):
+    """Starts the webhook receiver unless WEBHOOK_PORT is 0; it needs WEBHOOK_SECRET."""
+    global _client
+    if not settings.WEBHOOK_PORT:
+        return
+    if not settings.WEBHOOK_SECRET:
+        logger.error("WEBHOOK_PORT is set but WEBHOOK_SECRET is empty; webhook receiver not started.")
+        return
+    _client = client
+    try:
+        await webhook_server.start()
+    except OSError as e:
+        logger.error(f"Could not start webhook receiver on port {settings.WEBHOOK_PORT}: {e}")
+
+
+async def stop_webhook_server():
+    await webhook_server.stop()
@@ -20,8 +20,106 @@ class Config(BaseSettings):
     TVDB_API_KEY: str
     
 
+    # Upstream HTTP: timeouts (seconds), per-upstream pools, optional HTTP/2 (needs h2)
+    HTTP_CONNECT_TIMEOUT: float = 3.0
+    HTTP_READ_TIMEOUT: float = 10.0
+    HTTP_FAST_READ_TIMEOUT: float = 5.0
+    HTTP_BULK_READ_TIMEOUT: float = 30.0
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_WARMUP_CONNECTIONS: int = 2
+    HTTP2: bool = False
+    JELLYSEERR_MAX_CONNECTIONS: int = 20
+    JELLYSEERR_MAX_KEEPALIVE: int = 10
+    JELLYFIN_MAX_CONNECTIONS: int = 10
+    JELLYFIN_MAX_KEEPALIVE: int = 5
+    # Retries of idempotent requests and the per-upstream circuit breaker
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF: float = 0.3
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_TIMEOUT: float = 30.0
+
     # Path to the database
     DB_PATH: str = "jellyseerr_bot.db"
+    # Long-lived SQLite connections shared by all queries
+    DB_POOL_SIZE: int = 4
+    # Prepared statements kept per pooled connection
+    DB_STATEMENT_CACHE_SIZE: int = 128
+
+    # Jellyseerr search results cache
+    SEARCH_CACHE_TTL: int = 3600
+    SEARCH_CACHE_SIZE: int = 512
+    # Result lists behind the ⬅️/➡️ buttons of search and /discover messages
+    RESULT_SESSION_TTL: int = 3600
+    RESULT_SESSION_SIZE: int = 10000
+    # Pages of results kept per session, and how close to the end of a page the next one is fetched
+    RESULT_WINDOW_PAGES: int = 3
+    RESULT_PREFETCH_MARGIN: int = 5
+    # Movie/TV details shown on /requests pages
+    DETAILS_CACHE_TTL: int = 21600
+    DETAILS_CACHE_SIZE: int = 2048
+    # /requests loads the user's requests this many at a time, newest first
+    REQUESTS_PAGE_SIZE: int = 10
+    # /requests warms details for this many requests, with bounded parallelism
+    DETAILS_PREFETCH_COUNT: int = 10
+    DETAILS_PREFETCH_CONCURRENCY: int = 4
+    # Per-user /requests lists: TTL, max users and total memory budget
+    REQUEST_CACHE_TTL: int = 300
+    REQUEST_CACHE_SIZE: int = 5000
+    REQUEST_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+    # How often the shared /discover feed is refreshed, seconds
+    DISCOVER_REFRESH_INTERVAL: int = 900
+
+    # /watch history sync: page size and how long /watch waits for it, seconds
+    WATCH_SYNC_PAGE_SIZE: int = 500
+    WATCH_SYNC_WAIT: float = 3.0
+
+    # Local Jellyfin/Jellyseerr user directory: delta sync interval, seconds
+    USER_DIRECTORY_SYNC_INTERVAL: int = 600
+    USER_DIRECTORY_PAGE_SIZE: int = 100
+
+    # Expired-user cleanup: parallel deletions and retry backoff, seconds
+    EXPIRY_CONCURRENCY: int = 8
+    EXPIRY_RETRY_BASE_DELAY: int = 30
+    EXPIRY_RETRY_MAX_DELAY: int = 3600
+
+    # Update dispatcher: handler workers, of which at most UPDATE_HEAVY_WORKERS run /watch and searches
+    UPDATE_WORKERS: int = 64
+    UPDATE_HEAVY_WORKERS: int = 32
+
+    # Outgoing Telegram calls: messages per second overall and per chat (with burst),
+    # longest FloodWait worth waiting out, and retries after FloodWait or network errors
+    SEND_GLOBAL_RATE: float = 30.0
+    SEND_CHAT_RATE: float = 1.0
+    SEND_CHAT_BURST: float = 5.0
+    SEND_MAX_FLOOD_WAIT: int = 60
+    SEND_RETRIES: int = 3
+
+    # /broadcast: recipients read and sent per batch (progress is saved after each),
+    # and how often the admin's status message is updated, seconds
+    BROADCAST_BATCH_SIZE: int = 200
+    BROADCAST_PROGRESS_INTERVAL: int = 5
+
+    # Conversation state (/request, /link, admin flows): lifetime and sweep interval, seconds
+    USER_STATE_TTL: int = 900
+    USER_STATE_SWEEP_INTERVAL: int = 300
+    # Keep state in SQLite: survives restarts and is shared by bot processes
+    USER_STATE_PERSIST: bool = False
+
+    # Jellyseerr/Jellyfin webhook receiver; 0 disables it. Deliveries must send
+    # "Authorization: <WEBHOOK_SECRET>"
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 0
+    WEBHOOK_SECRET: str = ""
+
+    # Prometheus /metrics endpoint; 0 disables it
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 0
+
+    # Handlers slower than this (seconds) are logged with a timing breakdown; 0 disables
+    SLOW_HANDLER_THRESHOLD: float = 1.0
+    # Where /profile saves .prof files (empty: only log the report)
+    PROFILE_DIR: str = ""
+    PROFILE_TOP_FUNCTIONS: int = 25
 
     # Admin User IDs
     ADMIN_USER_IDS: list[int]
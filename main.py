@@ -7,7 +7,17 @@ from pyrogram.types import BotCommandScopeChat
 from config import settings
 from bot import app
 from bot.services import database
-from bot.services.http_clients import close_http_client
+from bot.services.http_clients import close_http_client, warm_up_http_clients
+from bot.services.discover import discover_feed
+from bot.services.user_directory import user_directory
+from bot.services.user_state import user_states
+from bot.services.metrics import instrument_handler, start_metrics_server, stop_metrics_server
+from bot.services.webhooks import start_webhook_server, stop_webhook_server
+from bot.services.send_queue import send_scheduler
+from bot.services.broadcast import resume_broadcasts, stop_broadcasts
+from bot.services.profiling import profile_handler
+from bot.services.dispatcher import dispatch_handler, update_dispatcher
+from bot.i18n import localize_handler
 from bot.handlers import load_all_handlers
 from tasks import check_expired_users_task
 
@@ -34,6 +44,8 @@ ADMIN_COMMANDS = USER_COMMANDS + [
     BotCommand("vip", "Создать VIP-аккаунт на 30 дней"),
     BotCommand("deleteuser", "Удалить пользователя: /deleteuser <username>"),
     BotCommand("listusers", "Показать всех пользователей Jellyfin"),
+    BotCommand("profile", "Профилировать обработчик: /profile <handler> [N]"),
+    BotCommand("broadcast", "Рассылка всем пользователям: /broadcast <текст>"),
 ]
 
 
@@ -59,8 +71,16 @@ async def start_services(client: Client):
         logger.error(f"Failed to set bot commands: {e}")
 
     await database.init_db()
-
+    await warm_up_http_clients()
+    await start_metrics_server()
+    await start_webhook_server(client)
+    update_dispatcher.start()
+
+    discover_feed.start()
+    user_directory.start()
+    user_states.start()
     asyncio.create_task(check_expired_users_task(client))
+    await resume_broadcasts(client)
     logger.info("Background task created. Bot is ready!")
 
 
@@ -68,8 +88,17 @@ async def start_services(client: Client):
 async def stop_services(client: Client):
     """Async tasks to run *before* Pyrogram disconnects."""
     logger.info("Running shutdown services...")
+    await stop_metrics_server()
+    await stop_webhook_server()
+    await update_dispatcher.stop()
+    await stop_broadcasts()
+    await discover_feed.stop()
+    await user_directory.stop()
+    await user_states.stop()
+    await send_scheduler.stop()
     await close_http_client()
-    logger.info("HTTP client closed.")
+    logger.info("HTTP clients closed.")
+    await database.close_db()
 
 
 if __name__ == "__main__":
@@ -80,9 +109,12 @@ if __name__ == "__main__":
     app.bot_token = settings.TELEGRAM_BOT_TOKEN
 
     logger.info("Loading handlers...")
-    load_all_handlers(app)
+    load_all_handlers(app, middlewares=(instrument_handler, profile_handler, localize_handler, dispatch_handler))
     logger.info("Handlers loaded.")
 
+    # Все исходящие вызовы с чатом проходят через лимиты Telegram
+    send_scheduler.install(app)
+
     logger.info("Bot configured. Starting Pyrogram's app.run()...")
     app.run()
 
@@ -1,98 +1,233 @@
 import asyncio
 import httpx
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
 from pyrogram import Client
 
 from config import settings
 
-from bot.services.database import get_all_expiring_users, delete_linked_user
-
-from bot.services.http_clients import http_client, jellyfin_headers, jellyseerr_headers
+from bot.services.database import (
+    get_due_expiring_users,
+    get_next_expiry,
+    delete_linked_user,
+    expiry_changed,
+)
+
+from bot.services.metrics import CallbackMetric
+from bot.services.send_queue import bulk_sends
+from bot.services.http_clients import (
+    jellyfin_client,
+    jellyfin_headers,
+    jellyseerr_client,
+    jellyseerr_headers,
+)
 
 logger = logging.getLogger(__name__)
 
+# Even with no known deadline, re-check the table this often
+MAX_SLEEP_SECONDS = 60 * 60
+
+# telegram_id -> (failed attempts, next attempt UTC) for users whose deletion failed
+_retry_queue: dict[str, tuple[int, datetime]] = {}
+
+# Stats of the last cycle that had due users, for logs and monitoring
+last_cycle_stats = {"processed": 0, "failed": 0, "retried": 0, "duration": 0.0}
+
+CallbackMetric(
+    "tellyseerr_expiry_last_cycle",
+    "Stats of the last expiry cycle that had due users (duration in seconds).",
+    ("stat",),
+    lambda: (((name,), value) for name, value in last_cycle_stats.items()),
+)
+CallbackMetric(
+    "tellyseerr_expiry_retry_queue",
+    "Expired users waiting for another deletion attempt.",
+    (),
+    lambda: [((), len(_retry_queue))],
+)
+
+
+async def _expire_user(
+    app: Client, telegram_id: str, jellyseerr_user_id: str, jellyfin_user_id: str
+):
+    """Deletes one expired user from Jellyfin, Jellyseerr and the bot database.
+
+    Returns True on success. 404s count as success, so a retry after a
+    partial failure does not get stuck on an already deleted account.
+    """
+    logger.info(f"User {telegram_id} has expired. Deleting...")
+    try:
+        jf_del_url = f"{settings.JELLYFIN_URL}/Users/{jellyfin_user_id}"
+        jf_res = await jellyfin_client.delete(jf_del_url, headers=jellyfin_headers)
+        if jf_res.status_code != 404:
+            jf_res.raise_for_status()
+        logger.info(f"Deleted Jellyfin user: {jellyfin_user_id}")
+
+        js_del_url = f"{settings.JELLYSEERR_URL}/api/v1/user/{jellyseerr_user_id}"
+        js_res = await jellyseerr_client.delete(js_del_url, headers=jellyseerr_headers)
+        if js_res.status_code != 404:
+            js_res.raise_for_status()
+        logger.info(f"Deleted Jellyseerr user: {jellyseerr_user_id}")
+
+        try:
+            # Массовая рассылка при истечении не должна тормозить ответы пользователям
+            with bulk_sends():
+                await app.send_message(
+                    chat_id=int(telegram_id),
+                    text="Your temporary access to the media server has expired and your account has been deleted.",
+                )
+            logger.info(f"Notified user {telegram_id} of expiration.")
+        except Exception as e:
+            logger.warning(f"Could not DM user {telegram_id} about expiration: {e}")
+
+        # --- 4. Cleanup DB ---
+        await delete_linked_user(telegram_id)
+        logger.info(f"Unlinked expired user from bot database: {telegram_id}")
+        return True
+
+    except httpx.RequestError as e:
+        logger.error(f"Failed to delete expired user {telegram_id} via API: {e}")
+    except Exception as e:
+        logger.error(
+            f"An unexpected error occurred while processing expiration for user {telegram_id}: {e}"
+        )
+    return False
+
+
+def _parse_expiry(expires_at) -> datetime | None:
+    """expires_at as a naive UTC datetime, or None (logged) if it is malformed."""
+    try:
+        parsed = datetime.fromisoformat(expires_at)
+    except (TypeError, ValueError):
+        logger.error(f"Invalid expires_at format: {expires_at!r}")
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _schedule_retry(telegram_id: str) -> datetime:
+    attempts = _retry_queue.get(telegram_id, (0, None))[0] + 1
+    delay = min(
+        settings.EXPIRY_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.EXPIRY_RETRY_MAX_DELAY,
+    )
+    next_attempt = datetime.utcnow() + timedelta(seconds=delay)
+    _retry_queue[telegram_id] = (attempts, next_attempt)
+    logger.warning(
+        f"Will retry expiration of user {telegram_id} in {delay}s (attempt {attempts})."
+    )
+    return next_attempt
+
+
+async def _process_due_users(app: Client):
+    """Deletes every due user with at most EXPIRY_CONCURRENCY in flight."""
+    started = time.monotonic()
+    now = datetime.utcnow()
+    due_users = []
+    # Строковое сравнение в SQL — перед удалением проверяем дату сами
+    for row in await get_due_expiring_users(now.isoformat()):
+        expires_at = _parse_expiry(row[3])
+        if expires_at is None:
+            continue
+        if expires_at > now:
+            logger.warning(f"Skipping user {row[0]}: expires_at {row[3]!r} is not due yet")
+            continue
+        due_users.append(row)
+
+    # Пользователи, удалённые иначе (например, /deleteuser), больше не ждут повтора
+    due_ids = {row[0] for row in due_users}
+    for telegram_id in list(_retry_queue):
+        if telegram_id not in due_ids:
+            del _retry_queue[telegram_id]
+
+    ready = [
+        row
+        for row in due_users
+        if row[0] not in _retry_queue or _retry_queue[row[0]][1] <= now
+    ]
+    if not ready:
+        return
+
+    logger.info(f"{len(ready)} users have expired.")
+    stats = {"processed": 0, "failed": 0, "retried": 0}
+    queue: asyncio.Queue = asyncio.Queue()
+    for row in ready:
+        queue.put_nowait(row)
+
+    async def worker():
+        while True:
+            try:
+                telegram_id, jellyseerr_user_id, jellyfin_user_id, _ = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            is_retry = telegram_id in _retry_queue
+            if is_retry:
+                stats["retried"] += 1
+            if await _expire_user(app, telegram_id, jellyseerr_user_id, jellyfin_user_id):
+                stats["processed"] += 1
+                _retry_queue.pop(telegram_id, None)
+            else:
+                stats["failed"] += 1
+                _schedule_retry(telegram_id)
+
+    workers = min(settings.EXPIRY_CONCURRENCY, len(ready))
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+
+    stats["duration"] = round(time.monotonic() - started, 3)
+    last_cycle_stats.update(stats)
+    logger.info(
+        f"Expiry cycle: processed={stats['processed']} failed={stats['failed']} "
+        f"retried={stats['retried']} duration={stats['duration']}s"
+    )
+
+
+async def _seconds_until_next_expiry() -> float:
+    deadlines = [next_attempt for _, next_attempt in _retry_queue.values()]
+    next_expiry = await get_next_expiry(datetime.utcnow().isoformat())
+    if next_expiry is not None:
+        expires_at = _parse_expiry(next_expiry)
+        if expires_at is not None and expires_at <= datetime.utcnow():
+            # Строка позже now, а дата — нет: запрос должников её не вернёт, не крутимся впустую
+            logger.error(f"expires_at {next_expiry!r} is not in normalized form, ignoring it")
+        elif expires_at is not None:
+            deadlines.append(expires_at)
+    if not deadlines:
+        return MAX_SLEEP_SECONDS
+    delay = (min(deadlines) - datetime.utcnow()).total_seconds()
+    return min(max(delay, 0), MAX_SLEEP_SECONDS)
+
 
 async def check_expired_users_task(app: Client):
     """
-    A background task that runs once daily to check for and DELETE expired users.
+    A background task that DELETES expired users as soon as they expire.
+
+    Each cycle asks the database (via the expires_at index) only for users
+    that are due now, deletes them through a bounded worker pool, then
+    sleeps until the next deadline or retry. Saving a new expiry with
+    store_linked_user wakes the task up early.
     """
     while not app.is_connected:
         await asyncio.sleep(1)
 
-    logger.info("Starting daily check for expired users...")
+    logger.info("Starting expiry scheduler...")
 
     while True:
-        now = datetime.utcnow()
-        jellyfin_url = settings.JELLYFIN_URL
-        jellyseerr_url = settings.JELLYSEERR_URL
-
-        expiring_users = await get_all_expiring_users()
-        logger.info(f"Checking {len(expiring_users)} users for expiration.")
-
-        for user_row in expiring_users:
-            try:
-                telegram_id, jellyseerr_user_id, jellyfin_user_id, expires_at_str = (
-                    user_row
-                )
-            except ValueError:
-                logger.error(f"Error unpacking user row: {user_row}")
-                continue
-
-            if not expires_at_str:
-                continue
-
-            try:
-                expires_at = datetime.fromisoformat(expires_at_str)
-            except ValueError:
-                logger.error(
-                    f"Invalid expires_at format for user {telegram_id}: {expires_at_str}"
-                )
-                continue
-
-            if now >= expires_at:
-                logger.info(f"User {telegram_id} has expired. Deleting...")
-                try:
-                    jf_del_url = f"{jellyfin_url}/Users/{jellyfin_user_id}"
-                    jf_res = await http_client.delete(
-                        jf_del_url, headers=jellyfin_headers, timeout=10
-                    )
-                    jf_res.raise_for_status()
-                    logger.info(f"Deleted Jellyfin user: {jellyfin_user_id}")
-
-                    js_del_url = f"{jellyseerr_url}/api/v1/user/{jellyseerr_user_id}"
-                    js_res = await http_client.delete(
-                        js_del_url, headers=jellyseerr_headers, timeout=10
-                    )
-                    if js_res.status_code != 404:
-                        js_res.raise_for_status()
-                    logger.info(f"Deleted Jellyseerr user: {jellyseerr_user_id}")
-
-                    try:
-                        await app.send_message(
-                            chat_id=int(telegram_id),
-                            text="Your temporary access to the media server has expired and your account has been deleted.",
-                        )
-                        logger.info(f"Notified user {telegram_id} of expiration.")
-                    except Exception as e:
-                        logger.warning(
-                            f"Could not DM user {telegram_id} about expiration: {e}"
-                        )
-
-                    # --- 4. Cleanup DB ---
-                    await delete_linked_user(telegram_id)
-                    logger.info(
-                        f"Unlinked expired user from bot database: {telegram_id}"
-                    )
-
-                except httpx.RequestError as e:
-                    logger.error(
-                        f"Failed to delete expired user {telegram_id} via API: {e}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"An unexpected error occurred while processing expiration for user {telegram_id}: {e}"
-                    )
-
-        # Wait for 24 hours
-        await asyncio.sleep(60 * 60 * 24)
+        # Сбрасываем до запроса, чтобы не потерять изменение, пришедшее во время цикла
+        expiry_changed.clear()
+
+        try:
+            await _process_due_users(app)
+        except Exception as e:
+            logger.error(f"Expiry cycle failed: {e}")
+
+        try:
+            delay = await _seconds_until_next_expiry()
+        except Exception as e:
+            logger.error(f"Could not compute the next expiry, re-checking in {MAX_SLEEP_SECONDS}s: {e}")
+            delay = MAX_SLEEP_SECONDS
+        try:
+            await asyncio.wait_for(expiry_changed.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass